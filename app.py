@@ -1,17 +1,16 @@
-import asyncio
-import platform
-
-if platform.system() == "Windows":
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-
 import streamlit as st
 import pandas as pd
-from typing import Dict, List
+import pyarrow as pa
+from typing import Dict, List, Tuple
 import time
-from urllib.parse import urlparse
+from functools import lru_cache
+from urllib.parse import urlparse, ParseResult
 
 # Import your WebCrawler class
-from backend.webcrawler import WebCrawler  # Adjust import path as needed
+from backend.webcrawler import WebCrawler, crawl_many  # Adjust import path as needed
+from backend.browser_pool import BrowserPool
+# Shared event loop, browser pool and image prefetch (also sets the Windows loop policy)
+from backend.runtime import run_async, get_browser_pool, prefetch_images
 
 st.set_page_config(
     page_title="Web Crawler Dashboard",
@@ -19,25 +18,74 @@ st.set_page_config(
     layout="wide"
 )
 
+MAIN_CONTENT_CHUNK_SIZE = 5000  # characters sent to the browser per rerun
+PARAGRAPHS_PER_PAGE = 20
+
+@lru_cache(maxsize=256)
+def parse_url(url: str) -> ParseResult:
+    """urlparse memoized: every rerun re-parses the same URLs"""
+    return urlparse(url)
+
 def is_valid_url(url: str) -> bool:
     """Validate if the provided URL is valid"""
     try:
-        result = urlparse(url)
+        result = parse_url(url)
         return all([result.scheme, result.netloc])
     except:
         return False
 
-async def crawl_website(url: str, js_wait_time: int, crawler: WebCrawler):
-    """Initialize crawler and navigate to URL using the WebCrawler's method"""
-    try:
-        # Use the WebCrawler's own crawl method
-        success = await crawler.crawl_with_playwright(url, js_wait_time)
-        return success
-    except Exception as e:
-        st.error(f"Failed to load website: {str(e)}")
-        return False
+async def extract_selected(crawler: WebCrawler, selected_options: List[str]):
+    """
+    Run the selected extractors in turn on a crawled page's single parse. Page Content goes
+    last: extract_page_content strips nav, header, footer, forms... from the shared tree.
+    """
+    extractors = {
+        "Page Content": ('page_content', crawler.extract_page_content),
+        "Spell Check": ('spell_check', crawler.highlight_incorrect_text),
+        "Images": ('images', crawler.extract_images),
+        "Links": ('links', crawler.extract_links),
+        "Tables": ('tables', crawler.extract_tables),
+    }
+    ordered = sorted(selected_options, key=lambda option: option == "Page Content")
+    jobs = [extractors[option] for option in ordered if option in extractors]
+
+    data, errors = {}, {}
+    for key, extract in jobs:
+        try:
+            data[key] = await extract()
+        except Exception as e:
+            errors[key] = str(e)
+    return data, errors
+
+async def crawl_batch(urls: List[str], js_wait_time: int, selected_options: List[str],
+                      pool: BrowserPool, max_concurrency: int = 5):
+    """Crawl and extract several URLs on the shared browser, at most `max_concurrency` at a time"""
+    return await crawl_many(urls, concurrency=max_concurrency, wait_time=js_wait_time, pool=pool,
+                            extract=lambda crawler: extract_selected(crawler, selected_options))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def cached_crawl(urls: Tuple[str, ...], js_wait_time: int, selected_options: Tuple[str, ...]):
+    """Crawl and extract once per (urls, wait time, options) so repeat crawls skip Playwright"""
+    results = run_async(crawl_batch(list(urls), js_wait_time, list(selected_options), get_browser_pool()))
+    if all(isinstance(result, Exception) for result in results):
+        # Nothing worked: raise so the failure is not cached
+        raise results[0]
 
-def display_page_content(content: Dict[str, str]):
+    crawled = {}
+    for url, result in zip(urls, results):
+        if isinstance(result, Exception):
+            crawled[url] = {"error": str(result)}
+        else:
+            data, errors = result
+            crawled[url] = {"data": data, "errors": errors}
+    return crawled
+
+@st.cache_data(show_spinner=False)
+def df_to_csv(df: pd.DataFrame) -> bytes:
+    """CSV bytes for a download button, encoded once per DataFrame content"""
+    return df.to_csv(index=False).encode('utf-8')
+
+def display_page_content(content: Dict[str, str], url: str):
     """Display page content information"""
     st.subheader("📄 Page Content")
     
@@ -61,18 +109,37 @@ def display_page_content(content: Dict[str, str]):
     with col2:
         if content.get('headings'):
             st.write("**Headings:**")
-            headings_df = pd.DataFrame(content['headings'])
-            st.dataframe(headings_df, use_container_width=True)
+            # Streamlit renders Arrow tables natively, no pandas round trip
+            headings_table = pa.Table.from_pylist(content['headings'])
+            st.dataframe(headings_table, use_container_width=True)
     
     if content.get('main_content'):
+        main_content = content['main_content']
         st.write("**Main Content:**")
         with st.expander("View Full Content", expanded=False):
-            st.text_area("Content", content['main_content'], height=300, disabled=True)
+            # Only one chunk is serialized on each rerun, not the whole document
+            num_chunks = (len(main_content) - 1) // MAIN_CONTENT_CHUNK_SIZE + 1
+            chunk = 1
+            if num_chunks > 1:
+                # Keyed on the page and its size: a value kept from a longer page never
+                # exceeds this page's max_value
+                chunk = st.number_input("Chunk", min_value=1, max_value=num_chunks,
+                                        key=f"main_content_chunk:{url}:{num_chunks}")
+                st.caption(f"Chunk {chunk} of {num_chunks} ({len(main_content):,} characters)")
+            start = (chunk - 1) * MAIN_CONTENT_CHUNK_SIZE
+            st.text_area("Content", main_content[start:start + MAIN_CONTENT_CHUNK_SIZE], height=300, disabled=True)
     
     if content.get('paragraphs'):
+        paragraphs = content['paragraphs']
         st.write("**Paragraphs:**")
-        with st.expander(f"View All {len(content['paragraphs'])} Paragraphs", expanded=False):
-            for i, paragraph in enumerate(content['paragraphs'], 1):
+        with st.expander(f"View All {len(paragraphs)} Paragraphs", expanded=False):
+            num_pages = (len(paragraphs) - 1) // PARAGRAPHS_PER_PAGE + 1
+            page = 1
+            if num_pages > 1:
+                page = st.number_input("Page", min_value=1, max_value=num_pages,
+                                       key=f"paragraphs_page:{url}:{num_pages}")
+            start = (page - 1) * PARAGRAPHS_PER_PAGE
+            for i, paragraph in enumerate(paragraphs[start:start + PARAGRAPHS_PER_PAGE], start + 1):
                 st.write(f"**Paragraph {i}:**")
                 st.write(paragraph)
                 st.divider()
@@ -88,7 +155,7 @@ def display_spell_check(spell_check_df: pd.DataFrame):
         st.dataframe(spell_check_df, use_container_width=True)
         
         # Download option
-        csv = spell_check_df.to_csv(index=False)
+        csv = df_to_csv(spell_check_df)
         st.download_button(
             "Download Spell Check Results",
             csv,
@@ -96,41 +163,41 @@ def display_spell_check(spell_check_df: pd.DataFrame):
             "text/csv"
         )
 
-def display_images(images: List[Dict[str, str]]):
+def display_images(images_df: pd.DataFrame):
     """Display extracted images"""
     st.subheader("🖼️ Images")
     
-    if not images:
+    if images_df.empty:
         st.info("No images found on this page.")
         return
     
-    st.write(f"Found {len(images)} images")
-    
-    # Create DataFrame for better display
-    images_df = pd.DataFrame(images)
+    st.write(f"Found {len(images_df)} images")
     st.dataframe(images_df, use_container_width=True)
     
-    # Show image previews if src available
-    if 'src' in images_df.columns:
-        st.write("**Image Preview (first 5):**")
-        cols = st.columns(min(5, len(images)))
-        for i, (col, img) in enumerate(zip(cols, images[:5])):
-            with col:
-                if img.get('src'):
-                    try:
-                        st.image(img['src'], caption=f"Image {i+1}", use_container_width=True)
-                    except:
-                        st.write(f"Image {i+1}: {img.get('alt', 'No alt text')}")
+    # Show image previews
+    st.write("**Image Preview (first 5):**")
+    preview = images_df.head(5)
+    cols = st.columns(len(preview))
+    images = prefetch_images(tuple(preview['src']))
+    for i, (col, image, alt) in enumerate(zip(cols, images, preview['alt'])):
+        with col:
+            try:
+                if image is None:
+                    raise ValueError("image could not be downloaded")
+                st.image(image, caption=f"Image {i+1}", use_container_width=True)
+            except:
+                st.write(f"Image {i+1}: {alt}")
 
-def display_links(links: List[Dict[str, str]]):
-    """Display extracted links"""
+def display_links(links: Dict[str, pd.DataFrame]):
+    """Display extracted links ('all', 'internal' and 'external' frames)"""
     st.subheader("🔗 Links")
     
-    if not links:
+    links_df = links['all']
+    if links_df.empty:
         st.info("No links found on this page.")
         return
     
-    st.write(f"Found {len(links)} links")
+    st.write(f"Found {len(links_df)} links")
     
     # Filter options
     col1, col2 = st.columns(2)
@@ -140,18 +207,17 @@ def display_links(links: List[Dict[str, str]]):
         show_internal = st.checkbox("Show Internal Links Only", value=False)
     
     # Filter links based on selection
-    filtered_links = links
+    filtered_df = links_df
     if show_external and not show_internal:
-        filtered_links = [link for link in links if link.get('type') == 'external']
+        filtered_df = links['external']
     elif show_internal and not show_external:
-        filtered_links = [link for link in links if link.get('type') == 'internal']
+        filtered_df = links['internal']
     
-    if filtered_links:
-        links_df = pd.DataFrame(filtered_links)
-        st.dataframe(links_df, use_container_width=True)
+    if not filtered_df.empty:
+        st.dataframe(filtered_df, use_container_width=True)
         
         # Download option
-        csv = links_df.to_csv(index=False)
+        csv = df_to_csv(filtered_df)
         st.download_button(
             "Download Links",
             csv,
@@ -176,7 +242,7 @@ def display_tables(tables: List[pd.DataFrame]):
         st.dataframe(table, use_container_width=True)
         
         # Download option for each table
-        csv = table.to_csv(index=False)
+        csv = df_to_csv(table)
         st.download_button(
             f"Download Table {i}",
             csv,
@@ -192,7 +258,7 @@ def display_url_info(url: str):
     """Display URL information"""
     st.subheader("🌐 URL Info")
     
-    parsed_url = urlparse(url)
+    parsed_url = parse_url(url)
     
     col1, col2 = st.columns(2)
     
@@ -215,19 +281,20 @@ def main():
     # Initialize session state
     if 'crawled_data' not in st.session_state:
         st.session_state.crawled_data = {}
-    if 'crawler' not in st.session_state:
-        st.session_state.crawler = None
+    if 'crawl_status' not in st.session_state:
+        st.session_state.crawl_status = pd.DataFrame()
     
     # Sidebar for inputs
     with st.sidebar:
         st.header("Crawler Settings")
         
-        # URL input
-        url = st.text_input(
-            "Enter URL to crawl:",
+        # URL input (one per line, crawled concurrently)
+        urls_text = st.text_area(
+            "Enter URLs to crawl (one per line):",
             placeholder="https://example.com",
-            help="Enter a valid URL starting with http:// or https://"
+            help="Enter valid URLs starting with http:// or https://"
         )
+        urls = list(dict.fromkeys(line.strip() for line in urls_text.splitlines() if line.strip()))
         
         # JS loading wait time
         js_wait_time = st.slider(
@@ -255,55 +322,76 @@ def main():
             help="Choose what information to extract from the website"
         )
         
+        force_refresh = st.checkbox(
+            "Force refresh",
+            value=False,
+            help="Ignore cached results and crawl the website again"
+        )
+        
         # Crawl button
         crawl_button = st.button("🚀 Start Crawling", type="primary", use_container_width=True)
     
     # Main content area
     if crawl_button:
-        if not url:
+        invalid_urls = [url for url in urls if not is_valid_url(url)]
+        if not urls:
             st.error("Please enter a URL to crawl.")
-        elif not is_valid_url(url):
-            st.error("Please enter a valid URL (must include http:// or https://).")
+        elif invalid_urls:
+            st.error(f"Please enter valid URLs (must include http:// or https://): {', '.join(invalid_urls)}")
         elif not selected_options:
             st.error("Please select at least one content type to extract.")
         else:
-            # Initialize crawler
-            crawler = WebCrawler()
+            if force_refresh:
+                cached_crawl.clear()
             
-            with st.spinner("Initializing crawler..."):
-                success = asyncio.run(crawl_website(url, js_wait_time, crawler))
+            try:
+                with st.spinner(f"Crawling and extracting content from {len(urls)} URL(s)..."):
+                    results = cached_crawl(tuple(urls), js_wait_time, tuple(selected_options))
+                success = True
+            except Exception as e:
+                st.error(f"Failed to load website: {str(e)}")
+                success = False
             
             if success:
                 st.success("Successfully connected to website!")
                 
-                # Extract selected content
-                data = {}
+                crawled_data, status = {}, []
+                for url, result in results.items():
+                    if 'error' in result:
+                        status.append({"URL": url, "Status": "❌ Failed", "Error": result['error']})
+                        continue
+                    
+                    data, errors = result['data'], result['errors']
+                    for key, error in errors.items():
+                        st.error(f"Error during content extraction of {url} ({key}): {error}")
+                    
+                    # Build the DataFrames once here so reruns only re-render them
+                    if 'images' in data:
+                        data['images'] = pd.DataFrame(data['images'])
+                    if 'links' in data:
+                        # Split once so the filter checkboxes just pick a frame
+                        links_df = pd.DataFrame(data['links'])
+                        is_external = links_df['is_external'].astype(bool)
+                        data['links'] = {
+                            'all': links_df,
+                            'internal': links_df[~is_external],
+                            'external': links_df[is_external]
+                        }
+                    
+                    # URL info is pure Python, no need to go through the event loop
+                    if "URL Info" in selected_options:
+                        data['url_info'] = url
+                    
+                    crawled_data[url] = data
+                    status.append({
+                        "URL": url,
+                        "Status": "✅ OK",
+                        "Error": "; ".join(f"{key}: {error}" for key, error in errors.items())
+                    })
                 
-                with st.spinner("Extracting content..."):
-                    try:
-                        for option in selected_options:
-                            if option == "Page Content":
-                                data['page_content'] = asyncio.run(crawler.extract_page_content())
-                            elif option == "Spell Check":
-                                data['spell_check'] = asyncio.run(crawler.highlight_incorrect_text())
-                            elif option == "Images":
-                                data['images'] = asyncio.run(crawler.extract_images())
-                            elif option == "Links":
-                                data['links'] = asyncio.run(crawler.extract_links())
-                            elif option == "Tables":
-                                data['tables'] = asyncio.run(crawler.extract_tables())
-                            elif option == "URL Info":
-                                data['url_info'] = url
-                        
-                        # Store in session state
-                        st.session_state.crawled_data = data
-                        st.session_state.crawler = crawler
-                        
-                    except Exception as e:
-                        st.error(f"Error during content extraction: {str(e)}")
-                    finally:
-                        # Cleanup
-                        asyncio.run(crawler.cleanup())
+                # Store in session state
+                st.session_state.crawled_data = crawled_data
+                st.session_state.crawl_status = pd.DataFrame(status)
                 
                 st.success("Content extraction completed!")
     
@@ -312,7 +400,15 @@ def main():
         st.divider()
         st.header("📊 Extraction Results")
         
-        data = st.session_state.crawled_data
+        crawled_data = st.session_state.crawled_data
+        if len(st.session_state.crawl_status) > 1:
+            st.dataframe(st.session_state.crawl_status, use_container_width=True)
+        
+        if len(crawled_data) > 1:
+            selected_url = st.selectbox("Show results for:", list(crawled_data))
+        else:
+            selected_url = next(iter(crawled_data))
+        data = crawled_data[selected_url]
         
         # Create tabs for different content types
         tabs = []
@@ -348,7 +444,7 @@ def main():
             for tab, (content_type, content_data) in zip(tab_objects, tab_content):
                 with tab:
                     if content_type == 'page_content':
-                        display_page_content(content_data)
+                        display_page_content(content_data, selected_url)
                     elif content_type == 'spell_check':
                         display_spell_check(content_data)
                     elif content_type == 'images':
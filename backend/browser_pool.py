@@ -0,0 +1,161 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, List, Optional, Tuple
+from playwright.async_api import async_playwright, Playwright, Browser, BrowserContext
+
+class BrowserPool:
+    """
+    Keep one Playwright driver and one Chromium process alive and hand out
+    BrowserContexts, so a crawl only pays for a context instead of a cold browser start.
+    The browser is swapped for a fresh one every `max_contexts_per_browser` contexts,
+    so a long-running server does not accumulate Chromium leaks.
+
+    With `cdp_url` (e.g. a Chromium started once with --remote-debugging-port=9222) the
+    pool connects over CDP instead of launching, so several app processes share one
+    browser, each with its own contexts.
+
+    Playwright objects are bound to the event loop that created them: every
+    acquire/release must run on the loop that awaited `start()` (see `self.loop`).
+    """
+    def __init__(self, size: int = 4, headless: bool = True, max_contexts_per_browser: int = 100,
+                 launch_args: Optional[List[str]] = None, context_options: Optional[dict] = None,
+                 cdp_url: Optional[str] = None):
+        self.size = size
+        self.headless = headless
+        self.max_contexts_per_browser = max_contexts_per_browser
+        self.launch_args = launch_args or []
+        self.context_options = context_options or {}
+        self.cdp_url = cdp_url
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.playwright: Optional[Playwright] = None
+        self.browser: Optional[Browser] = None
+        self._idle: List[BrowserContext] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._contexts_created = 0
+
+    async def start(self) -> "BrowserPool":
+        """Launch Chromium and pre-create `size` contexts"""
+        self.loop = asyncio.get_running_loop()
+        self.playwright = await async_playwright().start()
+        self.browser = await self._launch()
+        self._semaphore = asyncio.Semaphore(self.size)
+        self._idle = [await self._new_context() for _ in range(self.size)]
+        return self
+
+    async def _launch(self) -> Browser:
+        if self.cdp_url:
+            # Closing a CDP-connected Browser only disconnects, the shared Chromium keeps running
+            return await self.playwright.chromium.connect_over_cdp(self.cdp_url)
+        return await self.playwright.chromium.launch(headless=self.headless, args=self.launch_args)
+
+    async def _new_context(self) -> BrowserContext:
+        self._contexts_created += 1
+        return await self.browser.new_context(**self.context_options)
+
+    async def _recycle(self):
+        """Swap in a fresh browser; the old one is closed once its last borrowed context comes back"""
+        # Reset first so a concurrent acquire does not recycle a second time
+        self._contexts_created = 0
+        old_browser, self.browser = self.browser, await self._launch()
+        idle, self._idle = self._idle, []
+        for context in idle:
+            await context.close()
+        if not old_browser.contexts:
+            await old_browser.close()
+
+    async def acquire(self) -> BrowserContext:
+        """Wait for a free slot and return a fresh context"""
+        await self._semaphore.acquire()
+        try:
+            if self._contexts_created >= self.max_contexts_per_browser:
+                await self._recycle()
+            if self._idle:
+                return self._idle.pop()
+            return await self._new_context()
+        except Exception:
+            self._semaphore.release()
+            raise
+
+    async def release(self, context: BrowserContext):
+        """Close a used context (no cookies leak between crawls) and pre-warm its replacement"""
+        try:
+            browser = context.browser
+            await context.close()
+            if browser is self.browser:
+                self._idle.append(await self._new_context())
+            elif browser and not browser.contexts:
+                # Last context of a recycled browser
+                await browser.close()
+        except Exception:
+            pass
+        finally:
+            self._semaphore.release()
+
+    @asynccontextmanager
+    async def context(self):
+        """`async with pool.context() as context:` acquire/release pair"""
+        context = await self.acquire()
+        try:
+            yield context
+        finally:
+            await self.release(context)
+
+    async def close(self):
+        """Shut down the browser and the Playwright driver"""
+        try:
+            if self.browser:
+                await self.browser.close()
+            if self.playwright:
+                await self.playwright.stop()
+        except Exception:
+            pass
+
+# HEADED=1 shows the highlight browser for local debugging; servers stay headless
+HEADED = os.getenv("HEADED") == "1"
+# CHROMIUM_NO_SANDBOX=1 turns off Chromium's sandbox, only for containers that cannot
+# provide it (e.g. running as root): the crawler loads arbitrary user-supplied URLs
+NO_SANDBOX = os.getenv("CHROMIUM_NO_SANDBOX") == "1"
+
+# Headless Chromium: no GPU process, /tmp instead of the small /dev/shm
+CHROMIUM_ARGS = ["--disable-gpu", "--disable-dev-shm-usage"] + (["--no-sandbox"] if NO_SANDBOX else [])
+
+# Headed pool used to show highlights to the user: one maximized window
+HEADED_POOL_OPTIONS = {
+    "size": 1,
+    "launch_args": ["--start-maximized"],
+    "context_options": {"no_viewport": True},
+}
+
+_shared_pools: Dict[Tuple[asyncio.AbstractEventLoop, bool], "asyncio.Future[BrowserPool]"] = {}
+
+async def shared_pool(headless: bool = True) -> BrowserPool:
+    """
+    The process-wide pool for the running event loop, started on first use.
+    Concurrent first callers wait on the same start instead of launching twice.
+    """
+    key = (asyncio.get_running_loop(), headless)
+    if key not in _shared_pools:
+        if headless:
+            # CHROMIUM_CDP_URL=http://localhost:9222 makes every process share one Chromium
+            pool = BrowserPool(headless=True, launch_args=CHROMIUM_ARGS,
+                               cdp_url=os.getenv("CHROMIUM_CDP_URL"))
+        else:
+            pool = BrowserPool(headless=False, **HEADED_POOL_OPTIONS)
+        _shared_pools[key] = asyncio.ensure_future(pool.start())
+    try:
+        return await _shared_pools[key]
+    except Exception:
+        # Do not cache a failed start
+        _shared_pools.pop(key, None)
+        raise
+
+async def close_shared_pools():
+    """Close every pool started on the running loop, headed or not (call on shutdown)"""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _shared_pools if key[0] is loop]:
+        try:
+            pool = await _shared_pools.pop(key)
+        except Exception:
+            continue
+        await pool.close()
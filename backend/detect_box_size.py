@@ -1,6 +1,12 @@
 import asyncio
-from playwright.async_api import async_playwright
+from playwright.async_api import async_playwright, Browser
+from .browser_pool import CHROMIUM_ARGS
+from typing import Dict, List, Optional
+from dataclasses import dataclass
 import statistics
+import base64
+import re
+import numpy as np
 from collections import defaultdict
 
 import platform
@@ -9,21 +15,67 @@ import os
 if platform.system() == "Windows":
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
+VIEWPORT = {"width": 1280, "height": 800}
+
+# A selector list made only of bare tag names is matched on the snapshot's tag codes
+_TAG_NAME_RE = re.compile(r"[a-zA-Z][a-zA-Z0-9-]*")
+
+def _analyze_tag_group(sizes: np.ndarray):
+    """Mean, deviations and abnormal mask (> 1.5 sample std) for one tag's font sizes"""
+    mean_size = float(sizes.mean())
+    std_dev = float(sizes.std(ddof=1))
+    deviations = np.abs(sizes - mean_size)
+    # A group with zero spread yields an all-False mask
+    return mean_size, deviations, deviations > 1.5 * std_dev
+
+def _percentile_thresholds(sizes: np.ndarray, percentile_threshold: float):
+    """Lower/upper font-size cut-offs, picked with np.partition (O(n)) instead of a sort"""
+    n = sizes.size
+    lower_threshold_idx = int(n * (100 - percentile_threshold) / 100)
+    upper_threshold_idx = int(n * percentile_threshold / 100)
+    lower_threshold_idx = lower_threshold_idx if lower_threshold_idx < n else 0
+    upper_threshold_idx = upper_threshold_idx if upper_threshold_idx < n else n - 1
+    
+    partitioned = np.partition(sizes, [lower_threshold_idx, upper_threshold_idx])
+    return float(partitioned[lower_threshold_idx]), float(partitioned[upper_threshold_idx])
+
+@dataclass
+class TextSnapshot:
+    """Column-major result of one DOM walk; the codes index into `tags` / `parents` (-1: no parent)"""
+    sizes: np.ndarray
+    tag_codes: np.ndarray
+    parent_codes: np.ndarray
+    tags: List[str]
+    parents: List[str]
+
 class TextSizeAnalyzer:
     def __init__(self):
+        self.playwright = None
         self.browser = None
+        self.context = None
         self.page = None
+        self._dom_hash = None
+        self._elements_cache = {}
+        self._metadata_cache = {}
     
-    async def setup(self):
-        """Initialize browser and page"""
-        playwright = await async_playwright().start()
-        self.browser = await playwright.chromium.launch(headless=False)
-        self.page = await self.browser.new_page()
+    async def setup(self, browser: Optional[Browser] = None):
+        """Initialize page, reusing an already running browser (e.g. a BrowserPool's) when given"""
+        if not browser:
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(headless=True, args=CHROMIUM_ARGS + ["--disable-background-networking"])
+            browser = self.browser
+        # Fixed viewport up front: no default-size layout followed by a relayout on resize
+        self.context = await browser.new_context(viewport=VIEWPORT)
+        self.page = await self.context.new_page()
     
     async def cleanup(self):
-        """Clean up browser resources"""
+        """Clean up browser resources (only the context when the browser is shared)"""
+        if self.context:
+            await self.context.close()
         if self.browser:
             await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
     
     async def get_element_font_size(self, element):
         """Get computed font size for an element"""
@@ -70,199 +122,337 @@ class TextSizeAnalyzer:
         """)
         return elements_by_level
     
-    async def find_abnormal_sizes_by_tag(self, tag_selector="p, h1, h2, h3, h4, h5, h6, span, div"):
-        """Find elements with abnormal font sizes grouped by tag type"""
-        elements_data = await self.page.evaluate(f"""
-            () => {{
-                const elements = document.querySelectorAll('{tag_selector}');
-                const tagGroups = {{}};
+    async def dom_fingerprint(self) -> str:
+        """
+        Cheap in-page version of the current DOM, used as the analysis cache key: a random
+        id per loaded document plus a counter a MutationObserver bumps on every change.
+        No serialization of the page.
+        """
+        self._dom_hash = await self.page.evaluate("""
+            () => {
+                if (!window.__textSizeDocId) {
+                    window.__textSizeDocId = Math.random().toString(36).slice(2);
+                    window.__textSizeVersion = 0;
+                    new MutationObserver(() => { window.__textSizeVersion++; }).observe(
+                        document, {subtree: true, childList: true, attributes: true, characterData: true}
+                    );
+                }
+                return window.__textSizeDocId + ':' + window.__textSizeVersion;
+            }
+        """)
+        return self._dom_hash
+    
+    async def collect_text_elements(self) -> TextSnapshot:
+        """
+        Walk the DOM once and return a TextSnapshot of every visible element with text:
+        float32 font sizes plus interned tag / parent-key codes, nothing else.
+        The elements stay in the page (window.__textSizeElements) so that text, class,
+        id and xpath are only serialized for the rows an analysis flags, see
+        element_metadata. getComputedStyle runs exactly once per element; the find_*
+        analyses share the result, which is cached per DOM fingerprint (not URL, so a
+        page that changed or was reloaded is re-analyzed).
+        """
+        cache_key = await self.dom_fingerprint()
+        if cache_key in self._elements_cache:
+            return self._elements_cache[cache_key]
+
+        result = await self.page.evaluate("""
+            () => {
+                const elements = [];
+                const tagCodes = [];
+                const parentCodes = [];
+                const tags = [];
+                const parents = [];
+                const tagIndex = new Map();
+                const parentIndex = new Map();
                 
-                elements.forEach(el => {{
-                    if (el.offsetParent !== null || el === document.body) {{
-                        const tagName = el.tagName.toLowerCase();
-                        const fontSize = parseFloat(window.getComputedStyle(el).fontSize);
+                function intern(index, list, key) {
+                    let code = index.get(key);
+                    if (code === undefined) {
+                        code = list.length;
+                        index.set(key, code);
+                        list.push(key);
+                    }
+                    return code;
+                }
+                
+                // Raw typed-array bytes as base64 instead of JSON numbers; fromCharCode
+                // is applied in chunks to stay under the argument limit
+                function toBase64(typed) {
+                    const bytes = new Uint8Array(typed.buffer);
+                    let binary = '';
+                    for (let i = 0; i < bytes.length; i += 0x8000) {
+                        binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+                    }
+                    return btoa(binary);
+                }
+                
+                // Flush pending layout once up front so the per-element
+                // getComputedStyle reads below never trigger a reflow
+                void document.body.offsetHeight;
+                const gcs = window.getComputedStyle.bind(window);
+                
+                document.querySelectorAll('*').forEach(el => {
+                    if (el.offsetParent !== null || el === document.body) {
                         const textContent = el.textContent?.trim();
                         
                         // Skip elements with no text content
                         if (!textContent || textContent.length === 0) return;
                         
-                        if (!tagGroups[tagName]) {{
-                            tagGroups[tagName] = [];
-                        }}
-                        
-                        tagGroups[tagName].push({{
-                            fontSize: fontSize,
-                            textContent: textContent.slice(0, 100),
-                            className: el.className,
-                            id: el.id,
-                            xpath: getXPath(el)
-                        }});
-                    }}
-                }});
+                        const parent = el.parentElement;
+                        elements.push(el);
+                        tagCodes.push(intern(tagIndex, tags, el.tagName.toLowerCase()));
+                        parentCodes.push(parent
+                            ? intern(parentIndex, parents, parent.tagName + (parent.className ? '.' + parent.className : '') + (parent.id ? '#' + parent.id : ''))
+                            : -1);
+                    }
+                });
                 
-                function getXPath(element) {{
-                    if (element.id) {{
-                        return `//*[@id="${{element.id}}"]`;
-                    }}
+                const sizes = new Float32Array(elements.length);
+                elements.forEach((el, i) => { sizes[i] = parseFloat(gcs(el).fontSize); });
+                
+                window.__textSizeElements = elements;
+                return {
+                    sizes: toBase64(sizes),
+                    tagCodes: toBase64(Int32Array.from(tagCodes)),
+                    parentCodes: toBase64(Int32Array.from(parentCodes)),
+                    tags: tags,
+                    parents: parents
+                };
+            }
+        """)
+
+        # Typed arrays are little-endian on every platform Chromium ships for
+        snapshot = TextSnapshot(
+            sizes=np.frombuffer(base64.b64decode(result['sizes']), dtype='<f4'),
+            tag_codes=np.frombuffer(base64.b64decode(result['tagCodes']), dtype='<i4'),
+            parent_codes=np.frombuffer(base64.b64decode(result['parentCodes']), dtype='<i4'),
+            tags=result['tags'],
+            parents=result['parents'],
+        )
+        self._elements_cache[cache_key] = snapshot
+        self._metadata_cache[cache_key] = {}
+        return snapshot
+
+    async def element_metadata(self, indices) -> Dict[int, dict]:
+        """
+        {textContent, className, id, xpath} for the given snapshot rows, fetched from the
+        page only for rows not seen yet under the current DOM fingerprint
+        """
+        cache = self._metadata_cache.setdefault(self._dom_hash, {})
+        missing = [int(i) for i in dict.fromkeys(indices) if i not in cache]
+        if missing:
+            records = await self.page.evaluate("""
+                (indices) => {
+                    const elements = window.__textSizeElements;
+                    if (!elements) return null;
                     
-                    let path = '';
-                    let current = element;
+                    // Memoized tag.class chains: a walk stops at the first ancestor whose
+                    // path is already known, so siblings share their parents' prefix
+                    const cssPaths = new Map();
                     
-                    while (current && current.nodeType === Node.ELEMENT_NODE) {{
-                        let selector = current.tagName.toLowerCase();
-                        if (current.className) {{
-                            selector += '.' + current.className.split(' ').join('.');
-                        }}
-                        path = selector + (path ? ' > ' + path : '');
-                        current = current.parentElement;
-                    }}
+                    function cssPath(element) {
+                        const parts = [];
+                        const walked = [];
+                        let prefix = '';
+                        let current = element;
+                        
+                        while (current && current.nodeType === Node.ELEMENT_NODE) {
+                            if (cssPaths.has(current)) {
+                                prefix = cssPaths.get(current);
+                                break;
+                            }
+                            let selector = current.tagName.toLowerCase();
+                            // getAttribute also works for SVG nodes, whose className is not a string
+                            const classes = (current.getAttribute('class') || '').trim();
+                            if (classes) {
+                                selector += '.' + classes.split(/\\s+/).join('.');
+                            }
+                            parts.push(selector);
+                            walked.push(current);
+                            current = current.parentElement;
+                        }
+                        
+                        // Cache every ancestor walked on the way down so later lookups stop early
+                        let path = prefix;
+                        for (let i = parts.length - 1; i >= 0; i--) {
+                            path = path ? path + ' > ' + parts[i] : parts[i];
+                            cssPaths.set(walked[i], path);
+                        }
+                        return path;
+                    }
                     
-                    return path;
-                }}
-                
-                return tagGroups;
-            }}
-        """)
+                    function getXPath(element) {
+                        if (element.id) {
+                            return `//*[@id="${element.id}"]`;
+                        }
+                        return cssPath(element);
+                    }
+                    
+                    return indices.map(i => {
+                        const el = elements[i];
+                        return {
+                            textContent: el.textContent.trim().slice(0, 100),
+                            className: el.className,
+                            id: el.id,
+                            xpath: getXPath(el)
+                        };
+                    });
+                }
+            """, missing)
+            if records is None:
+                # Same DOM but the page was reloaded: the element references are gone
+                self._elements_cache.pop(self._dom_hash, None)
+                await self.collect_text_elements()
+                return await self.element_metadata(indices)
+            cache.update(zip(missing, records))
+        return {int(i): cache[i] for i in indices}
+
+    async def _select_tags(self, snapshot: TextSnapshot, selector) -> np.ndarray:
+        """
+        Row indices of a snapshot matching a CSS selector ('*' keeps all). A list of bare
+        tag names is resolved on the tag codes; any other selector (classes, attributes,
+        combinators) is matched in the page against the collected elements.
+        """
+        if selector.strip() == "*":
+            return np.arange(snapshot.sizes.size)
+        tags = [tag.strip().lower() for tag in selector.split(",")]
+        if all(_TAG_NAME_RE.fullmatch(tag) for tag in tags):
+            codes = [code for code, tag in enumerate(snapshot.tags) if tag in tags]
+            return np.nonzero(np.isin(snapshot.tag_codes, codes))[0]
+
+        rows = await self.page.evaluate("""
+            (selector) => {
+                const elements = window.__textSizeElements;
+                if (!elements) return null;
+                const rows = [];
+                elements.forEach((el, i) => { if (el.matches(selector)) rows.push(i); });
+                return rows;
+            }
+        """, selector)
+        if rows is None:
+            # Same DOM but the page was reloaded: the element references are gone
+            self._elements_cache.pop(self._dom_hash, None)
+            return await self._select_tags(await self.collect_text_elements(), selector)
+        return np.asarray(rows, dtype=np.intp)
+    
+    async def find_abnormal_sizes_by_tag(self, tag_selector="p, h1, h2, h3, h4, h5, h6, span, div"):
+        """Find elements with abnormal font sizes grouped by tag type"""
+        snapshot = await self.collect_text_elements()
+        selected = await self._select_tags(snapshot, tag_selector)
+        
+        tag_groups = defaultdict(list)
+        for i, code in zip(selected.tolist(), snapshot.tag_codes[selected].tolist()):
+            tag_groups[snapshot.tags[code]].append(i)
+        
+        # Need at least 2 elements of a tag to compare, drop the rest before any stats
+        sizes_by_tag = {
+            tag: snapshot.sizes[indices]
+            for tag, indices in tag_groups.items()
+            if len(indices) >= 2
+        }
+        
+        # Vectorized per group in-process: shipping these small arrays to worker
+        # processes would cost more in pickling than the NumPy work itself
+        tags = list(sizes_by_tag)
+        results = [_analyze_tag_group(sizes_by_tag[tag]) for tag in tags]
+        
+        flagged = [
+            (tag, mean_size, deviations, i)
+            for tag, (mean_size, deviations, mask) in zip(tags, results)
+            for i in np.nonzero(mask)[0]
+        ]
+        metadata = await self.element_metadata([tag_groups[tag][i] for tag, _, _, i in flagged])
         
         abnormal_elements = []
         
-        for tag, elements in elements_data.items():
-            if len(elements) < 2:  # Need at least 2 elements to compare
-                continue
-                
-            font_sizes = [el['fontSize'] for el in elements]
-            mean_size = statistics.mean(font_sizes)
-            std_dev = statistics.stdev(font_sizes) if len(font_sizes) > 1 else 0
-            
-            # Define abnormal as elements that are more than 1.5 standard deviations from mean
-            threshold = 1.5 * std_dev if std_dev > 0 else 0
-            
-            for element in elements:
-                deviation = abs(element['fontSize'] - mean_size)
-                if deviation > threshold and std_dev > 0:
-                    abnormal_elements.append({
-                        'tag': tag,
-                        'fontSize': element['fontSize'],
-                        'meanSize': mean_size,
-                        'deviation': deviation,
-                        'textContent': element['textContent'],
-                        'className': element['className'],
-                        'id': element['id'],
-                        'xpath': element['xpath'],
-                        'anomalyType': 'larger' if element['fontSize'] > mean_size else 'smaller'
-                    })
+        for tag, mean_size, deviations, i in flagged:
+            element = metadata[tag_groups[tag][i]]
+            size = sizes_by_tag[tag][i]
+            abnormal_elements.append({
+                'tag': tag,
+                'fontSize': float(size),
+                'meanSize': mean_size,
+                'deviation': float(deviations[i]),
+                'textContent': element['textContent'],
+                'className': element['className'],
+                'id': element['id'],
+                'xpath': element['xpath'],
+                'anomalyType': 'larger' if size > mean_size else 'smaller'
+            })
         
         return abnormal_elements
     
     async def find_outliers_by_percentile(self, selector="*", percentile_threshold=95):
         """Find elements with font sizes in top/bottom percentiles"""
-        font_sizes_data = await self.page.evaluate(f"""
-            () => {{
-                const elements = document.querySelectorAll('{selector}');
-                const fontSizeData = [];
-                
-                elements.forEach(el => {{
-                    if (el.offsetParent !== null || el === document.body) {{
-                        const fontSize = parseFloat(window.getComputedStyle(el).fontSize);
-                        const textContent = el.textContent?.trim();
-                        
-                        if (textContent && textContent.length > 0) {{
-                            fontSizeData.push({{
-                                fontSize: fontSize,
-                                textContent: textContent.slice(0, 100),
-                                tagName: el.tagName.toLowerCase(),
-                                className: el.className,
-                                id: el.id
-                            }});
-                        }}
-                    }}
-                }});
-                
-                return fontSizeData;
-            }}
-        """)
+        snapshot = await self.collect_text_elements()
+        indices = await self._select_tags(snapshot, selector)
         
-        if not font_sizes_data:
+        if not indices.size:
             return []
         
-        font_sizes = [item['fontSize'] for item in font_sizes_data]
-        font_sizes.sort()
+        sizes = snapshot.sizes[indices]
         
         # Calculate percentile thresholds
-        n = len(font_sizes)
-        lower_threshold_idx = int(n * (100 - percentile_threshold) / 100)
-        upper_threshold_idx = int(n * percentile_threshold / 100)
+        lower_threshold, upper_threshold = _percentile_thresholds(sizes, percentile_threshold)
         
-        lower_threshold = font_sizes[lower_threshold_idx] if lower_threshold_idx < n else font_sizes[0]
-        upper_threshold = font_sizes[upper_threshold_idx] if upper_threshold_idx < n else font_sizes[-1]
+        mask = (sizes <= lower_threshold) | (sizes >= upper_threshold)
+        flagged = indices[mask].tolist()
+        metadata = await self.element_metadata(flagged)
         
         outliers = []
-        for item in font_sizes_data:
-            if item['fontSize'] <= lower_threshold or item['fontSize'] >= upper_threshold:
-                outliers.append({
-                    **item,
-                    'outlierType': 'small' if item['fontSize'] <= lower_threshold else 'large',
-                    'lowerThreshold': lower_threshold,
-                    'upperThreshold': upper_threshold
-                })
+        for j, size in zip(flagged, sizes[mask].tolist()):
+            parent_code = snapshot.parent_codes[j]
+            outliers.append({
+                'tagName': snapshot.tags[snapshot.tag_codes[j]],
+                'parentKey': snapshot.parents[parent_code] if parent_code >= 0 else None,
+                'fontSize': size,
+                **metadata[j],
+                'outlierType': 'small' if size <= lower_threshold else 'large',
+                'lowerThreshold': lower_threshold,
+                'upperThreshold': upper_threshold
+            })
         
         return outliers
     
     async def find_inconsistent_siblings(self):
         """Find elements with different font sizes among siblings"""
-        inconsistent_groups = await self.page.evaluate("""
-            () => {
-                const parentGroups = new Map();
-                const elements = document.querySelectorAll('*');
-                
-                elements.forEach(el => {
-                    if (el.offsetParent !== null || el === document.body) {
-                        const textContent = el.textContent?.trim();
-                        if (!textContent || textContent.length === 0) return;
-                        
-                        const parent = el.parentElement;
-                        if (!parent) return;
-                        
-                        const parentKey = parent.tagName + (parent.className ? '.' + parent.className : '') + (parent.id ? '#' + parent.id : '');
-                        
-                        if (!parentGroups.has(parentKey)) {
-                            parentGroups.set(parentKey, []);
-                        }
-                        
-                        parentGroups.get(parentKey).push({
-                            fontSize: parseFloat(window.getComputedStyle(el).fontSize),
-                            textContent: textContent.slice(0, 50),
-                            tagName: el.tagName.toLowerCase(),
-                            className: el.className,
-                            id: el.id
-                        });
-                    }
-                });
-                
-                const inconsistentGroups = [];
-                
-                parentGroups.forEach((siblings, parentKey) => {
-                    if (siblings.length < 2) return;
-                    
-                    const fontSizes = siblings.map(s => s.fontSize);
-                    const uniqueSizes = [...new Set(fontSizes)];
-                    
-                    if (uniqueSizes.length > 1) {
-                        const mean = fontSizes.reduce((a, b) => a + b, 0) / fontSizes.length;
-                        
-                        inconsistentGroups.push({
-                            parentKey: parentKey,
-                            siblings: siblings,
-                            fontSizeVariance: Math.max(...fontSizes) - Math.min(...fontSizes),
-                            meanSize: mean,
-                            uniqueSizes: uniqueSizes
-                        });
-                    }
-                });
-                
-                return inconsistentGroups;
-            }
-        """)
+        snapshot = await self.collect_text_elements()
+        sizes = snapshot.sizes.tolist()
+        
+        parent_groups = defaultdict(list)
+        for i, parent_code in enumerate(snapshot.parent_codes.tolist()):
+            if parent_code >= 0:
+                parent_groups[parent_code].append(i)
+        
+        inconsistent = []
+        for parent_code, indices in parent_groups.items():
+            if len(indices) < 2:
+                continue
+            
+            font_sizes = [sizes[i] for i in indices]
+            unique_sizes = list(dict.fromkeys(font_sizes))
+            
+            if len(unique_sizes) > 1:
+                inconsistent.append((parent_code, indices, font_sizes, unique_sizes))
+        
+        metadata = await self.element_metadata([i for _, indices, _, _ in inconsistent for i in indices])
+        
+        inconsistent_groups = []
+        for parent_code, indices, font_sizes, unique_sizes in inconsistent:
+            inconsistent_groups.append({
+                'parentKey': snapshot.parents[parent_code],
+                'siblings': [{
+                    'fontSize': sizes[i],
+                    'textContent': metadata[i]['textContent'][:50],
+                    'tagName': snapshot.tags[snapshot.tag_codes[i]],
+                    'className': metadata[i]['className'],
+                    'id': metadata[i]['id']
+                } for i in indices],
+                'fontSizeVariance': max(font_sizes) - min(font_sizes),
+                'meanSize': statistics.mean(font_sizes),
+                'uniqueSizes': unique_sizes
+            })
         
         return inconsistent_groups
 
@@ -309,20 +499,35 @@ async def main():
 
 # For targeting specific elements after detection
 async def highlight_abnormal_elements(page, abnormal_elements):
-    """Highlight detected abnormal elements on the page"""
-    for element in abnormal_elements:
-        if 'xpath' in element:
-            try:
-                locator = page.locator(f"xpath={element['xpath']}")
-                await locator.evaluate("""
-                    (el) => {
-                        el.style.border = '3px solid red';
-                        el.style.backgroundColor = 'rgba(255, 0, 0, 0.1)';
-                        el.title = `Abnormal font size: ${el.style.fontSize}`;
-                    }
-                """)
-            except Exception as e:
-                print(f"Could not highlight element: {e}")
+    """Highlight detected abnormal elements on the page in a single page.evaluate"""
+    paths = [element['xpath'] for element in abnormal_elements if 'xpath' in element]
+    if not paths:
+        return
+
+    missed = await page.evaluate("""
+        (paths) => {
+            let missed = 0;
+            paths.forEach(p => {
+                let el = null;
+                try {
+                    // getXPath yields an XPath for elements with an id, a CSS path otherwise
+                    el = p.startsWith('/')
+                        ? document.evaluate(p, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue
+                        : document.querySelector(p);
+                } catch (e) {}
+                if (!el) {
+                    missed++;
+                    return;
+                }
+                el.style.border = '3px solid red';
+                el.style.backgroundColor = 'rgba(255, 0, 0, 0.1)';
+                el.title = `Abnormal font size: ${el.style.fontSize}`;
+            });
+            return missed;
+        }
+    """, paths)
+    if missed:
+        print(f"Could not highlight {missed} element(s)")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -1,18 +1,58 @@
+import asyncio
+import aiofiles
 from playwright.async_api import async_playwright, Page, Locator
 from typing import List, Optional, Tuple
 from dataclasses import dataclass, field
 import os
 import tiktoken
-import json
+import orjson
 import pandas as pd
-import difflib
+from rapidfuzz.distance import Levenshtein
+from functools import lru_cache
+from collections import OrderedDict
 
+@lru_cache(maxsize=None)
+def _get_encoding(model_name: str) -> tiktoken.Encoding:
+    """tiktoken encoding for a model, looked up and built once per model name"""
+    return tiktoken.encoding_for_model(model_name)
+
+TOKEN_COUNT_CACHE_SIZE = 8192  # distinct texts whose token counts are remembered
+
+@lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)
 def num_tokens_from_model(string: str, model_name: str = "gpt-4o") -> int:
     """Returns the number of tokens in a text string for a specific model."""
-    encoding = tiktoken.encoding_for_model(model_name)
-    num_tokens = len(encoding.encode(string))
+    encoding = _get_encoding(model_name)
+    # Count only: plain page text, so skip the special-token scan of encode()
+    num_tokens = len(encoding.encode_ordinary(string))
     return num_tokens
 
+# LRU of (model_name, text) -> token count for num_tokens_batch. A plain lru_cache cannot
+# be used there: only the misses of a whole batch should go to encode_ordinary_batch
+_token_counts: "OrderedDict[Tuple[str, str], int]" = OrderedDict()
+
+def num_tokens_batch(strings: List[str], model_name: str = "gpt-4o") -> List[int]:
+    """
+    Returns the token count of every string. Texts seen before (repeated menu items,
+    footers, re-crawls of the same page) come from a cache; the rest are tokenized
+    in parallel by encode_ordinary_batch.
+    """
+    keys = [(model_name, string) for string in strings]
+    misses = list(dict.fromkeys(key for key in keys if key not in _token_counts))
+    if misses:
+        encoding = _get_encoding(model_name)
+        tokenized = encoding.encode_ordinary_batch([string for _, string in misses], num_threads=os.cpu_count() or 1)
+        for key, tokens in zip(misses, tokenized):
+            _token_counts[key] = len(tokens)
+
+    counts = []
+    for key in keys:
+        _token_counts.move_to_end(key)
+        counts.append(_token_counts[key])
+
+    while len(_token_counts) > TOKEN_COUNT_CACHE_SIZE:
+        _token_counts.popitem(last=False)
+    return counts
+
 SCROLL_STEP = 500  # Pixels to scroll each time
 DELAY_BETWEEN_SHOTS = 0.5  # Seconds to wait after scrolling (helps with lazy loading)
 COOKIE_BUTTON_XPATH = "//*[@id='cookie-agree']"
@@ -24,55 +64,78 @@ class Element:
     idx: int
     text: str
     locator: Optional[Locator] = None  # Optional, initialized to None
+    selector: Optional[str] = None  # CSS selector + nth của locator, cho highlight_many / unhighlight_many
+    nth: int = 0
     # token_num: int
 
+def _render_item(elem: Element) -> str:
+    """Một phần tử dạng JSON gọn (không indent, không khoảng trắng), như trong batch."""
+    # orjson (C) ra đúng dạng gọn, UTF-8 không escape, như json.dumps(ensure_ascii=False, separators=(',', ':'))
+    return orjson.dumps({"idx": elem.idx, "text": elem.text}).decode()
+
 async def find_dumb_text_batches(elements: List[Element], MAX_TOKENS: int) -> List[str]:
     """
     Chia danh sách Element thành các chuỗi JSON (batch),
     mỗi batch có số token <= MAX_TOKENS.
 
+    Mỗi phần tử chỉ được tokenize một lần (encode_ordinary_batch): số token của batch là tổng cộng dồn
+    của các phần tử, dấu phân cách và khung "[ ]", JSON chỉ được ghép khi đóng batch.
+    JSON không indent (separators gọn): ít token hơn nên mỗi batch chứa được nhiều phần tử hơn.
+    Xếp batch theo First-Fit-Decreasing (phần tử lớn trước, vào batch đầu tiên còn chỗ)
+    để có ít batch hơn, tức ít lần gọi LLM hơn.
+
     Returns:
         List[str]: Danh sách các chuỗi JSON, mỗi chuỗi là một batch hợp lệ.
     """
     if not elements:
         return []
 
-    batches = []  # Lưu các chuỗi JSON batch
-    current_batch = []  # Danh sách dict tạm
-    current_json = "[]"  # JSON string hiện tại
-    current_tokens = num_tokens_from_model(current_json)
-
-    for elem in elements:
-        # Thử thêm phần tử vào batch hiện tại
-        temp_batch = current_batch + [{"idx": elem.idx, "text": elem.text}]
-        temp_json = json.dumps(temp_batch, ensure_ascii=False, indent=2)
-        temp_tokens = num_tokens_from_model(temp_json)
-
-        if temp_tokens <= MAX_TOKENS:
-            # Vẫn trong giới hạn → thêm vào batch hiện tại
-            current_batch = temp_batch
-            current_json = temp_json
-            current_tokens = temp_tokens
+    items = [_render_item(elem) for elem in elements]
+
+    # Cận trên chặt chẽ: với BPE mức byte, mỗi token ứng với ít nhất 1 byte UTF-8,
+    # nên nếu cả batch gộp (kể cả "[", "]" và các dấu ",") có <= MAX_TOKENS byte
+    # thì mọi thứ vừa một batch, không cần gọi tiktoken
+    total_bytes = 2 + len(items) - 1 + sum(len(item.encode("utf-8")) for item in items)
+    if total_bytes <= MAX_TOKENS:
+        print(f"[✅] Batch đóng: <= {total_bytes} tokens")
+        print("[🎉] Tổng cộng: 1 batch được tạo.")
+        return ["[" + ",".join(items) + "]"]
+
+    frame_tokens = num_tokens_from_model("[]")  # "[" + ... + "]"
+    sep_tokens = num_tokens_from_model(",")
+
+    # Tokenize tất cả phần tử một lần, song song trên thread pool của tiktoken
+    item_token_counts = num_tokens_batch(items)
+
+    bins: List[List[int]] = []  # Chỉ số phần tử của từng batch
+    bin_tokens: List[int] = []  # Số token hiện tại của từng batch
+
+    order = sorted(range(len(elements)), key=lambda i: -item_token_counts[i])
+    for i in order:
+        item_tokens = item_token_counts[i]
+
+        if frame_tokens + item_tokens > MAX_TOKENS:
+            # 🚨 Phần tử một mình đã quá lớn
+            elem = elements[i]
+            print(f"[⚠️] Bỏ qua phần tử idx={elem.idx} - quá lớn để nằm trong batch nào (text: {elem.text[:50]}...)")
+            continue  # Bỏ qua, không thể xử lý
+
+        # First-fit: batch đầu tiên còn đủ chỗ
+        for b, tokens in enumerate(bin_tokens):
+            if tokens + sep_tokens + item_tokens <= MAX_TOKENS:
+                bins[b].append(i)
+                bin_tokens[b] = tokens + sep_tokens + item_tokens
+                break
         else:
-            # ❌ Vượt giới hạn
-            if not current_batch:
-                # 🚨 Ngay phần tử đầu tiên đã quá lớn
-                print(f"[⚠️] Bỏ qua phần tử idx={elem.idx} - quá lớn để nằm trong batch nào (text: {elem.text[:50]}...)")
-                continue  # Bỏ qua, không thể xử lý
-
-            # ✅ Đóng batch hiện tại
-            batches.append(current_json)
-            print(f"[✅] Batch đóng: {current_tokens} tokens")
-
-            # Bắt đầu batch mới với phần tử hiện tại
-            current_batch = [{"idx": elem.idx, "text": elem.text}]
-            current_json = json.dumps(current_batch, ensure_ascii=False, indent=2)
-            current_tokens = num_tokens_from_model(current_json)
-
-    # Đóng batch cuối cùng nếu còn
-    if current_batch:
-        batches.append(current_json)
-        print(f"[✅] Batch cuối: {current_tokens} tokens")
+            # Không batch nào vừa → mở batch mới
+            bins.append([i])
+            bin_tokens.append(frame_tokens + item_tokens)
+
+    # idx được giữ trong payload; trong mỗi batch giữ lại thứ tự DOM ban đầu
+    batches = []  # Lưu các chuỗi JSON batch
+    for indices, tokens in zip(bins, bin_tokens):
+        batches.append("[" + ",".join(items[i] for i in sorted(indices)) + "]")
+        print(f"[✅] Batch đóng: {tokens} tokens")
 
     print(f"[🎉] Tổng cộng: {len(batches)} batch được tạo.")
     return batches
@@ -90,31 +153,7 @@ async def get_common_text_elements(page: Page) -> List[Element]:
         "td", "th", "cite", "figcaption", "mark", "time"
     ]
 
-    elements: List[Element] = []
-
-    cnt = 0
-    # 2. Duyệt các selector cơ bản
-    for sel in base_selectors:
-        locator = page.locator(sel)
-        count = await locator.count()
-
-        for i in range(count):
-            elem = locator.nth(i)
-            try:
-                text = await elem.inner_text()  # inner_text() sạch hơn textContent
-                text = text.strip()
-                if text:
-                    elements.append(Element(
-                        idx = cnt,
-                        locator = elem,
-                        text = text,
-                        # token_num = num_tokens_from_model(text)
-                    ))
-                    cnt+=1
-            except Exception as e:
-                continue  # Bỏ qua nếu lỗi (ví dụ: element detached)
-
-    # 3. Thêm các locator đặc biệt (mặc dù là div, nhưng quan trọng)
+    # 2. Các locator đặc biệt (mặc dù là div, nhưng quan trọng)
     special_locators = [
         "div.logo-text",                    # ✅ Bạn muốn cái này
         "div.logo-subtitle",
@@ -122,24 +161,31 @@ async def get_common_text_elements(page: Page) -> List[Element]:
         "div.skypriority-logo"
     ]
 
-    for sel in special_locators:
-        locator = page.locator(sel)
-        count = await locator.count()
-        for i in range(count):
-            elem = locator.nth(i)
-            try:
-                text = await elem.inner_text()
-                text = text.strip()
-                if text:
-                    elements.append(Element(
-                        idx = cnt,
-                        locator = elem,
-                        text = text,
-                        # token_num = num_tokens_from_model(text)
-                    ))
-                    cnt+=1
-            except Exception as e:
-                continue
+    # 3. Mỗi nhóm là một selector gộp; cả hai nhóm được lấy trong một lần duyệt DOM
+    #    (một querySelectorAll) và một lần page.evaluate, thay vì một round-trip CDP
+    #    cho mỗi phần tử. nth là thứ tự của phần tử trong nhóm của nó.
+    groups = [", ".join(base_selectors), ", ".join(special_locators)]
+    items = await page.evaluate("""
+        (groups) => {
+            const out = groups.map(() => []);
+            const counts = groups.map(() => 0);
+            document.querySelectorAll(groups.join(', ')).forEach(el => {
+                groups.forEach((sel, g) => {
+                    if (!el.matches(sel)) return;
+                    const nth = counts[g]++;
+                    const text = (el.innerText || '').trim();  // innerText sạch hơn textContent
+                    if (text) out[g].push([g, nth, text]);
+                });
+            });
+            return out.flat();
+        }
+    """, groups)
+
+    # Locator chỉ là mô tả (không gọi CDP), dùng khi cần highlight sau này
+    elements: List[Element] = [
+        Element(idx=cnt, locator=page.locator(groups[g]).nth(nth), text=text, selector=groups[g], nth=nth)
+        for cnt, (g, nth, text) in enumerate(items)
+    ]
 
     # 4. Loại bỏ trùng lặp (dùng text + selector để xác định trùng)
     # seen = set()
@@ -177,8 +223,14 @@ async def close_popup_if_present(page: Page):
     
     return False
 
+async def _write_png(path: str, data: bytes):
+    async with aiofiles.open(path, "wb") as f:
+        await f.write(data)
+    print(f"Saved: {path}")
+
 async def screenshot(page: Page, OUTPUT_DIR):
     screenshot_count = 0
+    pending_writes: List[asyncio.Task] = []
     previous_height = await page.evaluate("document.body.scrollHeight")
     
     while True:
@@ -190,9 +242,10 @@ async def screenshot(page: Page, OUTPUT_DIR):
         # Generate filename
         screenshot_path = os.path.join(OUTPUT_DIR, f"screenshot_{screenshot_count:03d}.png")
 
-        # Take screenshot of current viewport
-        await page.screenshot(path=screenshot_path, full_page=False)  # Set True for full page
-        print(f"Saved: {screenshot_path}")
+        # Take screenshot of current viewport; the PNG is written in the background
+        # while the page scrolls and waits for the next shot
+        png = await page.screenshot(full_page=False)  # Set True for full page
+        pending_writes.append(asyncio.create_task(_write_png(screenshot_path, png)))
 
         # Scroll down by SCROLL_STEP
         await page.evaluate(f"window.scrollBy(0, {SCROLL_STEP})")
@@ -200,25 +253,26 @@ async def screenshot(page: Page, OUTPUT_DIR):
         # Wait a bit for content to load (important for infinite scroll, images, etc.)
         await page.wait_for_timeout(int(DELAY_BETWEEN_SHOTS * 1000))
 
-        # Check new scroll height
-        new_height = await page.evaluate("document.body.scrollHeight")
-        scroll_position = await page.evaluate("window.pageYOffset")
+        # Check new scroll height, position and viewport height in one round-trip
+        state = await page.evaluate(
+            "() => ({h: document.body.scrollHeight, y: window.pageYOffset, vh: window.innerHeight})"
+        )
+        new_height = state['h']
 
         # Break if no new content loaded and we can't scroll further
-        if new_height == previous_height and scroll_position + page.viewport_size['height'] >= new_height:
+        if new_height == previous_height and state['y'] + state['vh'] >= new_height:
             print("Reached the bottom of the page.")
             break
 
         previous_height = new_height
         screenshot_count += 1
 
-async def highlight_locator(locator: Locator):
-    """
-    Highlight một element bằng cách thêm một đường viền màu đỏ.
-    """
-    if locator:
-        await locator.evaluate('''
-            element => {
+    # Wait for the last PNGs to hit the disk
+    await asyncio.gather(*pending_writes)
+
+# Hàm JS dùng chung: highlight một element, ghi font-size vào ::after và trả về font-size
+_HIGHLIGHT_ELEMENT_JS = '''
+        function highlightElement(element) {
             const style = window.getComputedStyle(element);
             const font_size = style.fontSize;
             element.style.border = "2px solid red";
@@ -253,7 +307,31 @@ async def highlight_locator(locator: Locator):
             }
             // Gán textContent vào thuộc tính data-ai-text để ::after sử dụng
             element.setAttribute('data-ai-text', font_size);
-        }''')
+            return font_size;
+        }
+'''
+
+# Các script highlight được ghép sẵn một lần khi import, không ghép lại ở mỗi lần gọi
+_HIGHLIGHT_LOCATOR_JS = "element => {" + _HIGHLIGHT_ELEMENT_JS + "highlightElement(element); }"
+
+_HIGHLIGHT_TEXT_MATCHES_JS = "(needle) => {" + _HIGHLIGHT_ELEMENT_JS + """
+    const n = needle.toLowerCase();
+    const matched = new Set();
+    const walker = document.createTreeWalker(document.body, NodeFilter.SHOW_TEXT);
+    for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+        if (node.parentElement && node.nodeValue.toLowerCase().includes(n)) {
+            matched.add(node.parentElement);
+        }
+    }
+    return Array.from(matched, highlightElement);
+}"""
+
+async def highlight_locator(locator: Locator):
+    """
+    Highlight một element bằng cách thêm một đường viền màu đỏ.
+    """
+    if locator:
+        await locator.evaluate(_HIGHLIGHT_LOCATOR_JS)
 
     return None
 
@@ -266,6 +344,43 @@ async def unhighlight_locator(locator: Locator):
         element.style.backgroundColor = "";
     }''')
 
+# Chạy một callback trên phần tử thứ nth của mỗi selector; querySelectorAll chỉ chạy một lần cho mỗi selector
+_FOR_EACH_TARGET_JS = """
+        function forEachTarget(targets, callback) {
+            const found = new Map();
+            for (const [sel, nth] of targets) {
+                if (!found.has(sel)) found.set(sel, document.querySelectorAll(sel));
+                const element = found.get(sel)[nth];
+                if (element) callback(element);
+            }
+        }
+"""
+
+_HIGHLIGHT_MANY_JS = "(targets) => {" + _HIGHLIGHT_ELEMENT_JS + _FOR_EACH_TARGET_JS + "forEachTarget(targets, highlightElement); }"
+
+_UNHIGHLIGHT_MANY_JS = "(targets) => {" + _FOR_EACH_TARGET_JS + """
+    forEachTarget(targets, element => {
+        element.style.border = "";
+        element.style.backgroundColor = "";
+    });
+}"""
+
+async def highlight_many(page: Page, elements: List[Element]):
+    """
+    Highlight nhiều Element trong một lần page.evaluate (thay vì highlight_locator cho từng cái).
+    """
+    targets = [[el.selector, el.nth] for el in elements if el.selector]
+    if targets:
+        await page.evaluate(_HIGHLIGHT_MANY_JS, targets)
+
+async def unhighlight_many(page: Page, elements: List[Element]):
+    """
+    Xóa highlight của nhiều Element trong một lần page.evaluate.
+    """
+    targets = [[el.selector, el.nth] for el in elements if el.selector]
+    if targets:
+        await page.evaluate(_UNHIGHLIGHT_MANY_JS, targets)
+
 async def get_font_size(locator: Locator) -> str:
     """
     Lấy giá trị font-size của một Locator.
@@ -286,7 +401,7 @@ async def get_font_size(locator: Locator) -> str:
         print(f"[Lỗi khi lấy font-size] {e}")
         return None
 
-async def highlight_elements_with_text(page: Page, user_input: str):    
+async def highlight_elements_with_text(page: Page, user_input: str) -> List[str]:
     """
     Tìm tất cả các phần tử có chứa văn bản giống với `user_input` (toàn phần hoặc một phần),
     sau đó highlight chúng.
@@ -295,28 +410,33 @@ async def highlight_elements_with_text(page: Page, user_input: str):
         page (Page): Trang Playwright.
         user_input (str): Văn bản cần tìm.
     """
-    # Escape chuỗi để dùng trong XPath (tránh lỗi nếu có dấu ngoặc, trích dẫn, v.v.)
-    async def escape_xpath_string(s: str) -> str:
-        if "'" not in s:
-            return f"'{s}'"
-        if '"' not in s:
-            return f'"{s}"'
-        return "concat('" + "', '\"', '".join(s.split('"')) + "')"
-
-    escaped_text = await escape_xpath_string(user_input.strip())
-
-    # Tìm tất cả các phần tử có textContent chứa user_input (không phân biệt hoa thường)
-    locators = await page.locator(f"xpath=//*[contains(translate(text(), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), "
-                           f"translate({escaped_text}, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'))]")
-
-    count = await locators.count()
-    print(f"Tìm thấy {count} phần tử chứa văn bản: '{user_input}'")
-
-    async for i in range(count):
-        elem_locator = await locators.nth(i)
-        print(elem_locator.all_text_contents())
-        await highlight_locator(elem_locator)
-        sz = await get_font_size(elem_locator)
+    # Tìm và highlight tất cả các phần tử có text chứa user_input (không phân biệt hoa thường)
+    # trong một lần page.evaluate thay vì nth + highlight + get_font_size cho từng phần tử.
+    # So khớp bằng toLowerCase().includes trên các text node (thay cho XPath translate/contains)
+    font_sizes = await page.evaluate(_HIGHLIGHT_TEXT_MATCHES_JS, user_input.strip())
+
+    print(f"Tìm thấy {len(font_sizes)} phần tử chứa văn bản: '{user_input}'")
+    return font_sizes
+
+def _make_both_bold(wrong_text: str, correct_text: str) -> Tuple[str, str]:
+    """Wrap the words that differ between the two texts in ** **, word-by-word."""
+    words_wrong = wrong_text.split()
+    words_correct = correct_text.split()
+    
+    wrong_highlighted = words_wrong.copy()
+    correct_highlighted = words_correct.copy()
+    
+    # Align words with rapidfuzz's C++ Levenshtein (same opcodes as SequenceMatcher.get_opcodes)
+    for tag, i1, i2, j1, j2 in Levenshtein.opcodes(words_wrong, words_correct):
+        if tag != 'equal':  # This includes 'replace', 'insert', 'delete'
+            # Words in wrong text (to be deleted or replaced) → highlight in red/wrong
+            for i in range(i1, i2):
+                wrong_highlighted[i] = f"**{words_wrong[i]}**"
+            # Words in correct text (inserted or replacing) → highlight in correction
+            for j in range(j1, j2):
+                correct_highlighted[j] = f"**{words_correct[j]}**"
+    
+    return ' '.join(wrong_highlighted), ' '.join(correct_highlighted)
 
 def highlight_both_columns_differences(df: pd.DataFrame) -> pd.DataFrame:
     """
@@ -325,40 +445,15 @@ def highlight_both_columns_differences(df: pd.DataFrame) -> pd.DataFrame:
     - 'Correct Text Suggest': corrected words wrapped in ** **
     Based on word-by-word comparison.
     """
-    def make_both_bold(wrong_text, correct_text):
-        words_wrong = wrong_text.split()
-        words_correct = correct_text.split()
-        
-        # Align words using SequenceMatcher
-        matcher = difflib.SequenceMatcher(None, words_wrong, words_correct)
-        
-        wrong_highlighted = words_wrong.copy()
-        correct_highlighted = words_correct.copy()
-        
-        # Traverse opcodes to find differences
-        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
-            if tag != 'equal':  # This includes 'replace', 'insert', 'delete'
-                # Words in wrong text (to be deleted or replaced) → highlight in red/wrong
-                for i in range(i1, i2):
-                    if i < len(wrong_highlighted):
-                        wrong_highlighted[i] = f"**{words_wrong[i]}**"
-                # Words in correct text (inserted or replacing) → highlight in correction
-                for j in range(j1, j2):
-                    if j < len(correct_highlighted):
-                        correct_highlighted[j] = f"**{words_correct[j]}**"
-        
-        return ' '.join(wrong_highlighted), ' '.join(correct_highlighted)
-    
-    # Create new DataFrame
-    result_df = df[['Wrong Text', 'Correct Text Suggest']].copy()
-    
-    # Apply function and unpack both results
-    (
-        result_df['Wrong Text'],
-        result_df['Correct Text Suggest']
-    ) = zip(*df.apply(
-        lambda row: make_both_bold(row['Wrong Text'], row['Correct Text Suggest']),
-        axis=1
-    ))
+    # Iterate the two underlying arrays directly and build the frame in one go,
+    # no per-row Series and no copy-then-overwrite of the columns
+    pairs = [
+        _make_both_bold(wrong, correct)
+        for wrong, correct in zip(df['Wrong Text'].to_numpy(), df['Correct Text Suggest'].to_numpy())
+    ]
+    wrong_texts, correct_texts = zip(*pairs) if pairs else ((), ())
     
-    return result_df
\ No newline at end of file
+    return pd.DataFrame(
+        {'Wrong Text': wrong_texts, 'Correct Text Suggest': correct_texts},
+        index=df.index
+    )
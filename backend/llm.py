@@ -2,13 +2,40 @@ from openai import OpenAI, AsyncOpenAI
 from dotenv import load_dotenv
 from pydantic import BaseModel
 import os
+import asyncio
+import httpx
+from typing import Dict
 
 load_dotenv(override=True)
 
-client = AsyncOpenAI(
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    base_url="https://generativelanguage.googleapis.com/v1beta/openai/"
-)
+MAX_CONCURRENT_CHECKS = 16  # upper bound on in-flight Gemini requests (rate limits)
+
+_clients: Dict[asyncio.AbstractEventLoop, AsyncOpenAI] = {}
+
+def get_client() -> AsyncOpenAI:
+    """
+    Long-lived client for the running loop. Its HTTP/2 connection pool multiplexes
+    concurrent spelling checks over a kept-alive connection instead of paying a TCP+TLS
+    handshake each; it is bound to the loop that created it, hence one per loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        # Forget clients of loops that are gone (e.g. earlier asyncio.run calls)
+        for stale in [stale for stale in _clients if stale.is_closed()]:
+            del _clients[stale]
+        http_client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=MAX_CONCURRENT_CHECKS, max_connections=2 * MAX_CONCURRENT_CHECKS),
+            timeout=60,
+        )
+        client = AsyncOpenAI(
+            api_key=os.getenv("GOOGLE_API_KEY"),
+            base_url="https://generativelanguage.googleapis.com/v1beta/openai/",
+            http_client=http_client,
+        )
+        _clients[loop] = client
+    return client
 
 class Result(BaseModel):
     content: str
@@ -17,6 +44,16 @@ class Result(BaseModel):
 from typing import List
 import json
 
+# Structured output: the model must emit exactly a List[Result] JSON array,
+# so a malformed or differently shaped reply never has to be re-prompted
+RESULTS_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "results",
+        "schema": {"type": "array", "items": Result.model_json_schema()},
+    },
+}
+
 async def spelling_check(text: str) -> List[Result]:
     """
     Perform spelling check on a list of JSON objects in the following format:
@@ -47,13 +84,13 @@ async def spelling_check(text: str) -> List[Result]:
         f"{text}"
     )
 
-    response = await client.chat.completions.create(
+    response = await get_client().chat.completions.create(
         model=model,
         messages=[
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ],
-        response_format={"type": "json_object"},
+        response_format=RESULTS_RESPONSE_FORMAT,
     )
 
     # After receiving the response
@@ -62,6 +99,19 @@ async def spelling_check(text: str) -> List[Result]:
     
     return corrected_results
 
+async def spelling_check_many(batches: List[str]) -> List[List[Result]]:
+    """
+    Run spelling_check on every batch concurrently, at most MAX_CONCURRENT_CHECKS at a time.
+    Results are returned in the same order as `batches`.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_CHECKS)
+
+    async def check_one(batch: str) -> List[Result]:
+        async with semaphore:
+            return await spelling_check(batch)
+
+    return await asyncio.gather(*(check_one(batch) for batch in batches))
+
     
 def main():
     text= "Tôi là Nguyễn Hoangfd Dương, sinh năm 2000"
@@ -0,0 +1,83 @@
+import asyncio
+import atexit
+import concurrent.futures
+import platform
+import threading
+from typing import List, Optional, Tuple
+
+import aiohttp
+import streamlit as st
+
+from .browser_pool import BrowserPool, shared_pool, close_shared_pools
+from .webcrawler import WebCrawler
+
+# Module import runs once per process (Streamlit reruns only re-execute the app script),
+# so the policy is set before the shared loop is created and never again
+if platform.system() == "Windows":
+    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+@st.cache_resource
+def get_loop() -> asyncio.AbstractEventLoop:
+    """One long-lived event loop (on a daemon thread) shared by every rerun and session"""
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    atexit.register(close_loop_resources, loop)
+    return loop
+
+# Upper bound for one blocking call, so a stuck crawl (e.g. waiting on a full browser
+# pool) cannot hold a script thread forever
+RUN_ASYNC_TIMEOUT = 300
+
+def run_async(coro, timeout: Optional[float] = RUN_ASYNC_TIMEOUT):
+    """
+    Run a coroutine on the shared loop and block until it finishes (replaces asyncio.run).
+    After `timeout` seconds the coroutine is cancelled and TimeoutError is raised.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_loop())
+    try:
+        return future.result(timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+@st.cache_resource
+def get_browser_pool() -> BrowserPool:
+    """Launch Chromium once per server process; each crawl only opens a new context"""
+    # Playwright objects are bound to the loop that created them, so the pool
+    # is started on the shared loop and every crawl runs there too
+    return run_async(shared_pool())
+
+async def close_resources():
+    """Close the shared aiohttp session, then every browser pool started on the running loop"""
+    await WebCrawler.close_session()
+    await close_shared_pools()
+
+def close_loop_resources(loop: asyncio.AbstractEventLoop):
+    """
+    When the server exits: close the crawlers' aiohttp session (no unclosed session /
+    connector warnings) and stop Chromium and the Playwright driver, including the
+    headed pool and any spell-check page still open in a session
+    """
+    try:
+        asyncio.run_coroutine_threadsafe(close_resources(), loop).result(timeout=10)
+    except Exception:
+        pass
+
+async def fetch_images(srcs: Tuple[str, ...]) -> List[Optional[bytes]]:
+    """Download all image previews concurrently; a failed download yields None"""
+    async def fetch(session: aiohttp.ClientSession, src: str) -> Optional[bytes]:
+        try:
+            async with session.get(src, timeout=aiohttp.ClientTimeout(total=10)) as response:
+                response.raise_for_status()
+                return await response.read()
+        except Exception:
+            return None
+
+    # Same keep-alive session the crawler uses for static pages
+    session = await WebCrawler.get_session()
+    return await asyncio.gather(*(fetch(session, src) for src in srcs))
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def prefetch_images(srcs: Tuple[str, ...]) -> List[Optional[bytes]]:
+    """Image preview bytes, fetched in one concurrent batch per set of URLs"""
+    return run_async(fetch_images(srcs))
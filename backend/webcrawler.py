@@ -1,65 +1,133 @@
 import asyncio
-from openai import responses
-from playwright.sync_api import Locator
-import streamlit as st
-import requests
-from bs4 import BeautifulSoup
-from playwright.async_api import async_playwright, Page, Browser
+import aiohttp
+from bs4 import BeautifulSoup, UnicodeDammit
+from functools import cached_property
+from selectolax.lexbor import LexborHTMLParser
+from playwright.async_api import Page, Browser
 import pandas as pd
 from urllib.parse import urljoin, urlparse
 import time
-from typing import Dict, List, Optional
-from .llm import spelling_check, Result
+from typing import Awaitable, Callable, Dict, List, Optional, TYPE_CHECKING
+from .browser_pool import BrowserPool, shared_pool, HEADED
 from .helpers import (
     get_common_text_elements,
     find_dumb_text_batches,
     Element,
-    highlight_locator, 
-    unhighlight_locator, 
+    highlight_many,
+    unhighlight_many,
     get_font_size, 
     screenshot,
     close_cookies,
     close_popup_if_present
 )
 import json
+from io import StringIO
+
+if TYPE_CHECKING:
+    # Imported lazily by highlight_incorrect_text: openai/pydantic/httpx and the LLM
+    # client are only loaded once a spell check actually runs
+    from .llm import Result
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# Priority selectors for main content, and the same list as one selector for a single tree walk
+_MAIN_CONTENT_SELECTORS = (
+    'main', 'article', '[role="main"]', '.content', '.post-content',
+    '.entry-content', '.post-body', '.article-content', '.page-content',
+    '#content', '#main-content', '.main-content'
+)
+_MAIN_CONTENT_SELECTOR = ", ".join(_MAIN_CONTENT_SELECTORS)
+
+# Non-content elements removed once, before any extraction
+_NOISE_TAGS = frozenset({'script', 'style', 'nav', 'footer', 'header', 'aside', 'noscript', 'form', 'button'})
 
 class WebCrawler:
-    def __init__(self):
-        self.soup = None
+    # One aiohttp session per event loop, shared by every crawler (see get_session)
+    _sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+
+    def __init__(self, pool: Optional[BrowserPool] = None):
+        self.html: Optional[str] = None
+        self.tree = None
+        self._select_cache: Dict[tuple, object] = {}
         self.url = None
-        self.playwright = None
-        self.browser = None
+        # Why the last crawl_with_requests failed (None after a successful crawl)
+        self.error: Optional[str] = None
+        self.pool = pool
+        self.context = None
+        self._context_pool: Optional[BrowserPool] = None
         self.page = None
         self._locators_element: List[Element]
         self._text_batches: List[str]
-        self._correction_text: List[Result]
+        self._correction_text: List["Result"]
+        self._highlighted: List[Element] = []
+
+    async def _open_page(self, pool: Optional[BrowserPool] = None):
+        """Borrow a context from `pool` (default: this crawler's pool, else the shared one) and open a page"""
+        # Give back the page still held from a previous crawl first
+        await self.cleanup()
+        pool = pool or self.pool or await shared_pool()
+        self.context = await pool.acquire()
+        self._context_pool = pool
+        self.page = await self.context.new_page()
+
+    async def check_url_availability(self, url: str, method: str = "head") -> Dict[str, any]:
+        """
+        Check if URL is accessible. By default a HEAD request over the shared aiohttp
+        session (GET if the server refuses HEAD); method="browser" loads the page in
+        Chromium instead, for sites that only resolve with JavaScript.
+        """
+        if method == "browser":
+            return await self._check_url_with_browser(url)
 
-    async def check_url_availability(self, url: str) -> Dict[str, any]:
-        """Check if URL is accessible"""
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=True)
-        self.page = await self.browser.new_page()
+        try:
+            session = await self.get_session()
+            timeout = aiohttp.ClientTimeout(total=10)
+            async with session.head(url, allow_redirects=True, timeout=timeout) as response:
+                status, final_url, headers = response.status, str(response.url), response.headers
+            if status == 405:
+                # HEAD not allowed: headers only, the body is never read
+                async with session.get(url, allow_redirects=True, timeout=timeout) as response:
+                    status, final_url, headers = response.status, str(response.url), response.headers
+        except Exception as e:
+            print(f"❌ URL '{url}' is not available. Error: {e}")
+            return {
+                    "available": False
+                }
+
+        return self._availability(url, status, final_url, headers)
+
+    @staticmethod
+    def _availability(url: str, status: int, final_url: str, headers) -> Dict[str, any]:
+        available = status == 200
+        if available:
+            print(f"✅ URL '{url}' is available. Status: {status}")
+        else:
+            print(f"❌ URL '{url}' is not available. Status: {status}")
+        return {
+            "available": available,
+            "status_code": status,
+            "final_url": final_url,
+            "content_type": headers.get('content-type', 'Unknown'),
+            # Validators: unchanged values mean a cached crawl of the page is still current
+            "etag": headers.get('etag'),
+            "last_modified": headers.get('last-modified')
+        }
+
+    async def _check_url_with_browser(self, url: str) -> Dict[str, any]:
+        """check_url_availability through a pooled Chromium page"""
+        await self._open_page()
         
         try:
             # Điều hướng đến URL và lấy response
             response = await self.page.goto(url, wait_until="domcontentloaded")
-
-            if response and response.status == 200:
-                print(f"✅ URL '{url}' is available. Status: {response.status}")
+            if not response:
+                print(f"❌ URL '{url}' is not available. Status: No response")
                 return {
-                    "available": True,
-                    "status_code": response.status,
-                    "final_url": response.url,
-                    "content_type": response.headers.get('content-type', 'Unknown')
-                }
-            else:
-                print(f"❌ URL '{url}' is not available. Status: {response.status if response else 'No response'}")
-                return {
-                    "available": False,
-                    "status_code": response.status,
-                    "final_url": response.url,
-                    "content_type": response.headers.get('content-type', 'Unknown')
+                    "available": False
                 }
+            return self._availability(url, response.status, response.url, response.headers)
         except Exception as e:
             print(f"❌ URL '{url}' is not available. Error: {e}")
             return {
@@ -71,9 +139,8 @@ class WebCrawler:
     async def crawl_with_playwright(self, url: str, wait_time: int = 3) -> bool:
         """Crawl website using Playwright for JavaScript-heavy sites"""
         
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=True)
-        self.page = await self.browser.new_page()
+        # Borrow a context from the warm browser instead of launching Chromium
+        await self._open_page()
 
         # Set user agent and other headers
         await self.page.set_extra_http_headers({
@@ -84,40 +151,56 @@ class WebCrawler:
         # await close_cookies(self.page)
         # await close_popup_if_present(self.page)
 
-        html_content = await self.page.content()
-        self.soup = BeautifulSoup(html_content, 'html.parser')
-        self.url = url
+        self.load_html(url, await self.page.content())
 
-        await self.cleanup()
+        # The page stays open so highlight_incorrect_text can reuse it; see close()
+        return True
+
+    def _has_live_page(self) -> bool:
+        """Whether the borrowed context/page can still be used from the running event loop"""
+        if not (self.page or self.context):
+            return False
+        if self._context_pool and self._context_pool.loop is not asyncio.get_running_loop():
+            # Opened on a loop that is gone (e.g. an earlier asyncio.run): unusable and
+            # cannot be closed from here, just forget it
+            self.context, self.page = None, None
+            return False
         return True
 
     async def highlight_incorrect_text(self) -> pd.DataFrame:
 
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(headless=False, args=["--start-maximized"])
-        self.page = await self.browser.new_page(no_viewport=True)
+        # Reuse the page left open by crawl_with_playwright: no second navigation. Otherwise
+        # (requests crawl, or HEADED=1 for a maximized window to watch the highlights locally)
+        # open one; the page stays open until unhighlight_incorrect_text / close
+        if HEADED or not (self._has_live_page() and self.page):
+            await self._open_page(await shared_pool(headless=not HEADED))
 
-        # Set user agent and other headers
-        await self.page.set_extra_http_headers({
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-        })
-        
-        await self.page.goto(self.url, wait_until="domcontentloaded")
+            # Set user agent and other headers
+            await self.page.set_extra_http_headers({
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+            })
+            
+            await self.page.goto(self.url, wait_until="domcontentloaded")
 
         self._locators_element = await get_common_text_elements(page=self.page)
         self._text_batches = await find_dumb_text_batches(self._locators_element, MAX_TOKENS=100000)
-        self._correction_text = await spelling_check(self._text_batches[0])
+        from .llm import spelling_check_many
+
+        # Every batch is checked (concurrently), not just the first one
+        corrections = await spelling_check_many(self._text_batches)
+        self._correction_text = [res for batch in corrections for res in batch]
         raw_text = []
         edited_text = []
+        self._highlighted = []
 
         for res in self._correction_text:
-            content, idx = res.content, res.idx
-
-            print(self._locators_element[idx].locator)
-            await highlight_locator(self._locators_element[idx].locator)
+            element = self._locators_element[res.idx]
+            self._highlighted.append(element)
+            raw_text.append(element.text)
+            edited_text.append(res.content)
 
-            raw_text.append(self._locators_element[idx].text)
-            edited_text.append(content)
+        # One page.evaluate for all corrections instead of one per element
+        await highlight_many(self.page, self._highlighted)
         
         df = pd.DataFrame({
             'Wrong Text': raw_text,
@@ -128,197 +211,310 @@ class WebCrawler:
         return df
 
     async def unhighlight_incorrect_text(self):
-        for res in self._correction_text:
-            content, idx = res.content, res.idx
-            await unhighlight_locator(self._locators_element[idx].locator)       
+        # Same single round trip, over the elements highlighted last time
+        await unhighlight_many(self.page, self._highlighted)
+        self._highlighted = []
+
+    @classmethod
+    async def get_session(cls) -> aiohttp.ClientSession:
+        """
+        Long-lived ClientSession for the running loop: keep-alive connections and the
+        DNS cache are reused across crawls instead of a new pool + TLS handshake per call
+        """
+        loop = asyncio.get_running_loop()
+        session = cls._sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(limit=100, ttl_dns_cache=300, keepalive_timeout=60)
+            session = aiohttp.ClientSession(connector=connector, headers=DEFAULT_HEADERS)
+            cls._sessions[loop] = session
+        return session
+
+    @classmethod
+    async def close_session(cls):
+        """Close the running loop's shared session (call on shutdown)"""
+        session = cls._sessions.pop(asyncio.get_running_loop(), None)
+        if session:
+            await session.close()
 
     async def crawl_with_requests(self, url: str) -> bool:
-        """Crawl website using aiohttp + BeautifulSoup for static sites (async)"""
-        import aiohttp
-
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+        """
+        Crawl website using aiohttp + BeautifulSoup for static sites (async). On failure the
+        reason is kept in `self.error`: this runs on the shared loop's thread, where st.*
+        calls cannot reach the page, so the caller reports it.
+        """
+        self.error = None
         try:
-            async with aiohttp.ClientSession(headers=headers) as session:
-                async with session.get(url, timeout=15) as response:
-                    response.raise_for_status()
-                    content = await response.read()
-                    self.soup = BeautifulSoup(content, 'html.parser')
-                    self.url = url
-                    return True
+            session = await self.get_session()
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                response.raise_for_status()
+                content = await response.read()
+                # Use the charset from the Content-Type header when there is one, so
+                # the encoding is not sniffed; fall back to <meta> / detection otherwise
+                dammit = UnicodeDammit(content, [response.charset] if response.charset else [], is_html=True)
+                html = dammit.unicode_markup
+                if html is None:
+                    html = content.decode('utf-8', errors='replace')
+                self.load_html(url, html)
+                return True
 
         except Exception as e:
-            st.error(f"Requests crawling failed: {str(e)}")
+            self.error = f"Requests crawling failed: {e}"
             return False
 
+    @staticmethod
+    def _parse_soup(markup: str) -> BeautifulSoup:
+        """BeautifulSoup on the lxml C parser; the slow html5lib only if lxml fails on the markup"""
+        try:
+            return BeautifulSoup(markup, 'lxml')
+        except Exception:
+            return BeautifulSoup(markup, 'html5lib')
+
+    @cached_property
+    def soup(self) -> Optional[BeautifulSoup]:
+        """BeautifulSoup of self.html, only parsed when a bs4-only fallback asks for it"""
+        return self._parse_soup(self.html) if self.html is not None else None
+
+    def load_html(self, url: str, html_content: str):
+        """Parse already-fetched HTML (e.g. a cached crawl) so the extract_* methods can run"""
+        self.html = html_content
+        # Drop the previous page's soup; the next access re-parses lazily
+        self.__dict__.pop('soup', None)
+        # Fast C tree for every extractor (pd.read_html for tables reads the markup itself)
+        self.tree = LexborHTMLParser(html_content)
+        self.clear_cache()
+        self.url = url
+
+    def clear_cache(self):
+        """Forget cached selector results (new tree, or nodes removed from the current one)"""
+        self._select_cache = {}
+
+    def _select(self, selector: str) -> list:
+        """self.tree.css(selector), computed once per tree"""
+        key = ('all', selector)
+        if key not in self._select_cache:
+            self._select_cache[key] = self.tree.css(selector)
+        return self._select_cache[key]
+
+    def _select_first(self, selector: str):
+        """self.tree.css_first(selector), computed once per tree"""
+        if ('all', selector) in self._select_cache:
+            matches = self._select_cache[('all', selector)]
+            return matches[0] if matches else None
+        key = ('first', selector)
+        if key not in self._select_cache:
+            self._select_cache[key] = self.tree.css_first(selector)
+        return self._select_cache[key]
+
     async def extract_page_content(self) -> Dict[str, str]:
         """Extract basic page information with improved content detection"""
-        if not self.soup:
+        if not self.tree:
             return {}
 
-        # Remove unwanted elements
-        for element in self.soup(["script", "style", "nav", "footer", "header", "aside", "noscript"]):
-            element.decompose()
-        words = await self._get_main_content()
-        # print(words.s)
+        # Remove unwanted elements in one pass (strip_tags removes one tag name at a time,
+        # so a nested match is never decomposed after its ancestor)
+        self.tree.strip_tags(list(_NOISE_TAGS))
+        # Cached nodes may have just been removed from the tree
+        self.clear_cache()
+        main_content = self._get_main_content()
         return {
-            "title": await self._get_title(),
-            "meta_description":await self._get_meta_description(),
-            "meta_keywords":await self._get_meta_keywords(),
-            "main_content":await self._get_main_content(),
-            "headings":await self._get_headings(),
-            "word_count":len(words.split()),
-            "paragraphs":await self._get_paragraphs()
+            "title": self._get_title(),
+            "meta_description":self._get_meta_description(),
+            "meta_keywords":self._get_meta_keywords(),
+            "main_content":main_content,
+            "headings":self._get_headings(),
+            "word_count":len(main_content.split()),
+            "paragraphs":self._get_paragraphs()
         }
 
-    async def _get_title(self) -> str:
+    def _extract_head_meta(self) -> Dict[str, str]:
+        """<title>, meta description / og:description / keywords from a single pass over <head>"""
+        key = ('head_meta',)
+        if key not in self._select_cache:
+            head_meta = {}
+            scope = self.tree.head or self.tree
+            for node in scope.css('title, meta'):
+                if node.tag == 'title':
+                    head_meta.setdefault('title', node.text(strip=True))
+                    continue
+                attrs = node.attributes
+                content = attrs.get('content')
+                if not content:
+                    continue
+                if attrs.get('name') in ('description', 'keywords'):
+                    head_meta.setdefault(attrs['name'], content.strip())
+                elif attrs.get('property') == 'og:description':
+                    head_meta.setdefault('og:description', content.strip())
+            self._select_cache[key] = head_meta
+        return self._select_cache[key]
+
+    def _get_title(self) -> str:
         """Extract page title"""
-        if self.soup.title:
-            return self.soup.title.string.strip()
+        title = self._extract_head_meta().get('title')
+        if title:
+            return title
         
         # Try h1 as fallback
-        h1 = self.soup.find('h1')
+        h1 = self._select_first('h1')
         if h1:
-            return h1.get_text(strip=True)
+            return h1.text(strip=True)
         
         return "No title found"
 
-    async def _get_meta_description(self) -> str:
+    def _get_meta_description(self) -> str:
         """Extract meta description"""
-        meta_desc = self.soup.find("meta", attrs={"name": "description"})
-        if meta_desc and meta_desc.get("content"):
-            return meta_desc.get("content").strip()
-        
-        # Try Open Graph description
-        og_desc = self.soup.find("meta", attrs={"property": "og:description"})
-        if og_desc and og_desc.get("content"):
-            return og_desc.get("content").strip()
-        
-        return "No meta description found"
+        head_meta = self._extract_head_meta()
+        # Fall back to the Open Graph description
+        return head_meta.get('description') or head_meta.get('og:description') or "No meta description found"
 
-    async def _get_meta_keywords(self) -> str:
+    def _get_meta_keywords(self) -> str:
         """Extract meta keywords"""
-        meta_keywords = self.soup.find("meta", attrs={"name": "keywords"})
-        if meta_keywords and meta_keywords.get("content"):
-            return meta_keywords.get("content").strip()
-        return "No keywords found"
+        return self._extract_head_meta().get('keywords') or "No keywords found"
 
-    async def _get_main_content(self) -> str:
+    def _get_main_content(self) -> str:
         """Extract main text content with better content detection"""
-        # Priority selectors for main content
-        main_selectors = [
-            'main', 'article', '[role="main"]', '.content', '.post-content',
-            '.entry-content', '.post-body', '.article-content', '.page-content',
-            '#content', '#main-content', '.main-content'
-        ]
-        
-        for selector in main_selectors:
-            main_element = self.soup.select_one(selector)
-            if main_element:
-                return main_element.get_text(strip=True, separator=' ')
+        # One tree walk for all selectors, then pick by priority among the (few) matches;
+        # a plain css_first on the joined selector would pick by document order instead
+        matches = self._select(_MAIN_CONTENT_SELECTOR)
+        for selector in _MAIN_CONTENT_SELECTORS:
+            for main_element in matches:
+                if main_element.css_matches(selector):
+                    return self._joined_text(main_element)
         
-        # Fallback: find the largest text block
-        body = self.soup.find('body')
+        # Fallback: the whole body (non-content elements are already stripped)
+        body = self.tree.body
         if body:
-            # Remove common non-content elements
-            for element in body.find_all(['nav', 'header', 'footer', 'aside', 'form', 'button']):
-                element.decompose()
-            return body.get_text(strip=True, separator=' ')
+            return self._joined_text(body)
         
-        return self.soup.get_text(strip=True, separator=' ')
+        return self._joined_text(self.tree.root) if self.tree.root else ""
 
-    async def _get_paragraphs(self) -> List[str]:
+    @staticmethod
+    def _joined_text(node) -> str:
+        """
+        A node's text with single spaces, like BeautifulSoup's get_text(' ', strip=True):
+        selectolax keeps empty text nodes, which would leave double and trailing spaces
+        """
+        return ' '.join(node.text(separator=' ', strip=True).split())
+
+    def _get_paragraphs(self) -> List[str]:
         """Extract all paragraphs"""
         paragraphs = []
-        for p in self.soup.find_all('p'):
-            text = p.get_text(strip=True)
+        for p in self._select('p'):
+            text = p.text(strip=True)
             if len(text) > 20:  # Only meaningful paragraphs
                 paragraphs.append(text)
-        return paragraphs[:10]  # Limit to first 10 paragraphs
+                if len(paragraphs) == 10:  # Limit to first 10 paragraphs
+                    break
+        return paragraphs
 
-    async def _get_headings(self) -> List[Dict[str, str]]:
+    def _get_headings(self) -> List[Dict[str, str]]:
         """Extract all headings with improved structure"""
-        headings = []
-        for i in range(1, 7):
-            for heading in self.soup.find_all(f'h{i}'):
-                text = heading.get_text(strip=True)
-                if text:  # Only non-empty headings
-                    headings.append({
-                        "level": f"H{i}",
-                        "text": text,
-                        "id": heading.get('id', '')
-                    })
-        return headings
-
-    async def extract_images(self) -> List[Dict[str, str]]:
-        """Extract all images with metadata"""
-        if not self.soup:
-            return []
+        # One pass over h1-h6 in document order, bucketed by level so the result is
+        # still all H1s, then all H2s, ... (document order within a level), without a sort
+        by_level = {f"H{i}": [] for i in range(1, 7)}
+        for heading in self._select('h1, h2, h3, h4, h5, h6'):
+            text = heading.text(strip=True)
+            if text:  # Only non-empty headings
+                level = heading.tag.upper()
+                by_level[level].append({
+                    "level": level,
+                    "text": text,
+                    "id": heading.attributes.get('id') or ''
+                })
+        return [heading for level in by_level.values() for heading in level]
+
+    async def extract_images(self) -> Dict[str, List[str]]:
+        """Extract all images with metadata, column-major (one list per field)"""
+        images = {"src": [], "alt": [], "title": [], "width": [], "height": []}
+        if not self.tree:
+            return images
             
-        images = []
-        for img in self.soup.find_all('img'):
-            src = img.get('src', '')
+        scheme = urlparse(self.url).scheme
+        for img in self._select('img'):
+            attrs = img.attributes
+            src = attrs.get('src') or ''
             if src:
-                absolute_url = urljoin(self.url, src)
-                images.append({
-                    "src": absolute_url,
-                    "alt": img.get('alt', 'No alt text'),
-                    "title": img.get('title', ''),
-                    "width": img.get('width', ''),
-                    "height": img.get('height', '')
-                })
+                images["src"].append(self._absolute_url(self.url, scheme, src))
+                images["alt"].append(attrs.get('alt', 'No alt text') or '')
+                images["title"].append(attrs.get('title') or '')
+                images["width"].append(attrs.get('width') or '')
+                images["height"].append(attrs.get('height') or '')
         return images
 
-    async def extract_links(self, filter_external: bool = False) -> List[Dict[str, str]]:
-        """Extract links with filtering options"""
-        if not self.soup:
-            return []
+    @staticmethod
+    def _absolute_url(base_url: str, scheme: str, href: str) -> str:
+        """urljoin, skipped for hrefs that are already absolute or protocol-relative"""
+        if href.startswith(('https://', 'http://')):
+            return href
+        if href.startswith('//'):
+            return f"{scheme}:{href}"
+        return urljoin(base_url, href)
+
+    async def extract_links(self, filter_external: bool = False) -> Dict[str, list]:
+        """Extract links with filtering options, column-major (one list per field)"""
+        links = {"url": [], "text": [], "title": [], "is_external": [], "rel": [], "target": []}
+        if not self.tree:
+            return links
             
-        links = []
-        base_domain = urlparse(self.url).netloc
+        # Parse the base URL once; same-site links are recognised by prefix
+        base = urlparse(self.url)
+        base_domain = base.netloc
+        base_prefixes = tuple(f"{scheme}://{base_domain}{sep}" for scheme in ('https', 'http') for sep in '/?#')
+        base_origins = (f"https://{base_domain}", f"http://{base_domain}")
 
         # element = self.soup.find("a", attrs={"class": "menu__link menu__link--active"})
         # element.get_text()
         
-        for link in self.soup.find_all('a', href=True):
-            href = link['href']
+        for link in self._select('a[href]'):
+            attrs = link.attributes
+            href = attrs.get('href') or ''
             if not href or href.startswith('#'):  # Skip empty and anchor links
                 continue
                 
-            absolute_url = urljoin(self.url, href)
-            is_external = urlparse(absolute_url).netloc != base_domain
+            absolute_url = self._absolute_url(self.url, base.scheme, href)
+            if absolute_url.startswith(base_prefixes) or absolute_url in base_origins:
+                is_external = False
+            else:
+                is_external = urlparse(absolute_url).netloc != base_domain
             
             if filter_external and is_external:
                 continue
                 
-            text = link.get_text(strip=True)
+            text = link.text(strip=True)
             if not text:  # Skip links without text
                 continue
             
             # title = ''
             # title = link.get('title', '')
 
-            links.append({
-                "url": absolute_url,
-                "text": text[:100] + "..." if len(text) > 100 else text,  # Truncate long text
-                "title": link.get('title', ''),
-                "is_external": is_external,
-                "rel": ' '.join(link.get('rel', [])),
-                "target": link.get('target', '')
-            })
+            links["url"].append(absolute_url)
+            links["text"].append(text[:100] + "..." if len(text) > 100 else text)  # Truncate long text
+            links["title"].append(attrs.get('title') or '')
+            links["is_external"].append(is_external)
+            links["rel"].append(' '.join((attrs.get('rel') or '').split()))
+            links["target"].append(attrs.get('target') or '')
             
         return links
 
     async def extract_tables(self) -> List[pd.DataFrame]:
         """Extract all tables as DataFrames"""
-        if not self.soup:
+        if not self.tree:
             return []
-            
+
+        if not self._select('table'):
+            return []
+
+        # One lxml parse of the page for every table, instead of re-serializing and
+        # re-parsing each <table> subtree
+        try:
+            return pd.read_html(StringIO(self.html), flavor='lxml')
+        except Exception:
+            pass
+
+        # Fallback: a table pandas cannot parse, handle them one by one
         tables = []
         for table in self.soup.find_all('table'):
             try:
-                df = pd.read_html(str(table))[0]
+                df = pd.read_html(StringIO(str(table)), flavor='lxml')[0]
                 tables.append(df)
             except Exception:
                 # Fallback manual parsing
@@ -339,17 +535,48 @@ class WebCrawler:
         print(self.page)
 
     async def cleanup(self):
-        """Clean up Playwright resources"""
+        """Return the borrowed context to its pool (the shared browser keeps running)"""
+        if not self._has_live_page():
+            return
         try:
+            if self.context:
+                # Pooled page: closing the context closes the page, the browser stays warm
+                context, self.context, self.page = self.context, None, None
+                await self._context_pool.release(context)
             if self.page:
                 await self.page.close()
-            if self.browser:
-                await self.browser.close()
-            if self.playwright:
-                await self.playwright.stop()
         except Exception:
             pass
 
+    async def close(self):
+        """End of session: release the page kept open since the last crawl_with_playwright"""
+        await self.cleanup()
+
+async def crawl_many(urls: List[str], concurrency: int = 10, wait_time: int = 3,
+                     pool: Optional[BrowserPool] = None,
+                     extract: Optional[Callable[[WebCrawler], Awaitable[object]]] = None) -> List[object]:
+    """
+    Crawl several URLs concurrently on the shared browser, at most `concurrency` pages at once.
+    Returns, in input order, a parsed WebCrawler per URL (ready for the extract_* methods),
+    or what `extract(crawler)` returned while its page was still open, or the exception
+    that URL failed with.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def crawl_one(url: str) -> object:
+        async with semaphore:
+            crawler = WebCrawler(pool=pool)
+            try:
+                await crawler.crawl_with_playwright(url, wait_time)
+                if extract:
+                    return await extract(crawler)
+            finally:
+                # Give the context back to the pool; the parsed HTML stays usable
+                await crawler.close()
+            return crawler
+
+    return await asyncio.gather(*(crawl_one(url) for url in urls), return_exceptions=True)
+
 async def main():
     
     url = "https://duonghn257.github.io/demo_vna_cmc/"
@@ -366,7 +593,7 @@ async def main():
         # print(res)
         # print(len(data))
     input("Nhấn Enter để đóng trình duyệt...")
-    await crawler.cleanup()
+    await crawler.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
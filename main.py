@@ -1,15 +1,177 @@
 import streamlit as st
 from backend.webcrawler import WebCrawler
+from backend.browser_pool import BrowserPool, HEADED
+# Shared event loop, browser pool and image prefetch (also sets the Windows loop policy)
+from backend.runtime import run_async, get_browser_pool, prefetch_images
 from backend.helpers import highlight_both_columns_differences
 import pandas as pd
-from urllib.parse import urljoin, urlparse
-from playwright.sync_api import sync_playwright
+from urllib.parse import urlparse
 import asyncio
-import platform
 import os
+import re
+import hashlib
+import diskcache
+from typing import Dict, Optional, Tuple
 
-if platform.system() == "Windows":
-    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+@st.cache_resource
+def get_crawler() -> WebCrawler:
+    """
+    One WebCrawler shared by every session, for stateless calls (URL checks). Per-crawl
+    state lives in session_state (crawl_key) and in crawlers created per call.
+    """
+    return WebCrawler(pool=get_browser_pool())
+
+# HEADED=1: seconds a highlighted spell-check window stays open at most
+SPELL_PAGE_TTL = 120
+
+async def spell_check(url: str, pool: BrowserPool) -> Tuple[Optional[WebCrawler], pd.DataFrame]:
+    """
+    Spelling suggestions for `url`, highlighted on a page of its own. Headless, the page
+    is released straight away. With HEADED=1 the crawler is returned still open so the
+    highlighted window stays up while the result is shown; it is closed by
+    release_spell_crawler or after SPELL_PAGE_TTL seconds, whichever comes first.
+    """
+    crawler = WebCrawler(pool=pool)
+    crawler.url = url
+    try:
+        table = await crawler.highlight_incorrect_text()
+    except BaseException:
+        await crawler.close()
+        raise
+    if not HEADED:
+        await crawler.close()
+        return None, table
+    # A session that goes away never calls release_spell_crawler: do not hold the
+    # (single-slot) headed pool forever
+    asyncio.get_running_loop().call_later(SPELL_PAGE_TTL, lambda: asyncio.ensure_future(crawler.close()))
+    return crawler, table
+
+def release_spell_crawler():
+    """Close this session's spell-check page, if one is open"""
+    crawler = st.session_state.pop("spell_crawler", None)
+    if crawler is not None:
+        run_async(crawler.close())
+
+# Auto mode: sites that only render with JavaScript go straight to Playwright
+JS_ONLY_DOMAINS = frozenset({"youtube.com", "twitter.com", "x.com", "instagram.com", "facebook.com", "tiktok.com"})
+# Auto mode: a static page with less visible text than this is treated as a JS shell
+MIN_STATIC_TEXT_CHARS = 200
+
+def needs_javascript(url: str) -> bool:
+    """Whether `url` is on (a subdomain of) a known JavaScript-only site"""
+    host = urlparse(url).hostname or ""
+    return any(host == domain or host.endswith("." + domain) for domain in JS_ONLY_DOMAINS)
+
+async def crawl(url: str, use_playwright: bool, wait_time: int, pool: BrowserPool,
+                min_text_chars: int = 0) -> str:
+    """
+    Fetch `url` and return its HTML. Raises RuntimeError with the reason if the crawl
+    failed or the page has fewer than `min_text_chars` characters of visible text.
+    """
+    crawler = WebCrawler(pool=pool)
+    try:
+        if use_playwright:
+            success = await crawler.crawl_with_playwright(url, wait_time)
+        else:
+            success = await crawler.crawl_with_requests(url)
+        if not success:
+            raise RuntimeError(crawler.error or f"Could not crawl {url}")
+        if min_text_chars:
+            # Only the HTML string is returned, so the tree can be stripped in place
+            crawler.tree.strip_tags(["script", "style", "noscript", "template"])
+            body = crawler.tree.body
+            if body is None or len(body.text(strip=True)) < min_text_chars:
+                raise RuntimeError(f"The static page has less than {min_text_chars} characters of text")
+        return crawler.html
+    finally:
+        await crawler.close()
+
+@st.cache_resource
+def get_disk_cache() -> diskcache.Cache:
+    """Crawled HTML on disk (LRU, 1 GiB), so unchanged pages survive server restarts"""
+    return diskcache.Cache(".crawlcache", size_limit=2**30, eviction_policy="least-recently-used")
+
+def page_validator(url_status: Dict[str, object]) -> str:
+    """ETag / Last-Modified of the page, empty when the server sends neither"""
+    if not (url_status.get("etag") or url_status.get("last_modified")):
+        return ""
+    return f"{url_status.get('etag') or ''}|{url_status.get('last_modified') or ''}"
+
+# Seconds a crawled page is served from the caches (memory and disk) before a recrawl.
+# The ETag / Last-Modified validator only covers the HTML document, not the XHR data a
+# rendered page depends on, so disk entries expire too
+CRAWL_CACHE_TTL = 3600
+
+@st.cache_data(ttl=CRAWL_CACHE_TTL, show_spinner=False)
+def cached_crawl(url: str, crawl_method: str, wait_time: int, validator: str = "") -> Tuple[str, Optional[str]]:
+    """
+    HTML of `url`, crawled once per (url, method, wait time, page version) instead of on
+    every rerun, and why Auto mode fell back to Playwright (None if it did not). Raises
+    RuntimeError when the crawl fails, so failures are not cached. With a validator the
+    result is also kept on disk (for CRAWL_CACHE_TTL seconds) across restarts.
+    """
+    disk_key = None
+    if validator:
+        disk_key = hashlib.sha256(f"{url}\0{crawl_method}\0{wait_time}\0{validator}".encode()).hexdigest()
+        cached = get_disk_cache().get(disk_key)
+        # Entries written before the fallback reason was stored are plain HTML: recrawl those
+        if isinstance(cached, tuple):
+            return cached
+
+    pool = get_browser_pool()
+    fallback_reason = None
+    if crawl_method == "Playwright (JS support)" or (crawl_method == "Auto (Try both)" and needs_javascript(url)):
+        html = run_async(crawl(url, True, wait_time, pool))
+    elif crawl_method == "Auto (Try both)":
+        # An almost empty static page is a JS app shell: render it instead
+        try:
+            html = run_async(crawl(url, False, wait_time, pool, min_text_chars=MIN_STATIC_TEXT_CHARS))
+        except RuntimeError as e:
+            fallback_reason = str(e)
+            html = run_async(crawl(url, True, wait_time, pool))
+    else:
+        html = run_async(crawl(url, False, wait_time, pool))
+    if disk_key:
+        get_disk_cache().set(disk_key, (html, fallback_reason), expire=CRAWL_CACHE_TTL)
+    return html, fallback_reason
+
+EXTRACTORS = {
+    "Page Content": WebCrawler.extract_page_content,
+    "Images": WebCrawler.extract_images,
+    "Links": WebCrawler.extract_links,
+    "Tables": WebCrawler.extract_tables,
+}
+
+TABULAR_OPTIONS = frozenset({"Images", "Links"})
+
+async def extract_all(url: str, html: str, options: Tuple[str, ...]) -> Dict[str, object]:
+    """
+    Run the selected extractors on a single parse of the page (built in the executor).
+    extract_page_content strips tags from the tree, so it runs last.
+    """
+    crawler = WebCrawler()
+    await asyncio.get_running_loop().run_in_executor(None, crawler.load_html, url, html)
+    results = {}
+    for option in sorted(options, key=lambda option: option == "Page Content"):
+        results[option] = await EXTRACTORS[option](crawler)
+    # Images and links are displayed as tables: build the DataFrames here so they
+    # are cached with the extraction instead of rebuilt on every rerun. Arrow-backed
+    # columns serialize to st.dataframe (and the cache) without an object-dtype conversion
+    for option in TABULAR_OPTIONS.intersection(results):
+        results[option] = pd.DataFrame(results[option]).convert_dtypes(dtype_backend="pyarrow")
+    return results
+
+@st.cache_data(ttl=CRAWL_CACHE_TTL, show_spinner=False)
+def cached_extract(url: str, crawl_method: str, wait_time: int, validator: str,
+                   options: Tuple[str, ...]) -> Dict[str, object]:
+    """Extraction results for a cached crawl, computed once per crawl and set of options"""
+    return run_async(extract_all(url, cached_crawl(url, crawl_method, wait_time, validator)[0], options))
+
+MAIN_CONTENT_MAX_CHARS = 50_000  # characters sent to the browser per rerun
+TABLE_PREVIEW_ROWS = 1000
+
+# Case-insensitive match on the extension, without lowercasing every file name
+IMAGE_NAME_RE = re.compile(r"\.(png|jpe?g|gif)\Z", re.IGNORECASE)
 
 def display_images_from_folder(folder_path):
     """
@@ -17,21 +179,21 @@ def display_images_from_folder(folder_path):
     """
     st.title("Hiển thị Hình ảnh từ Thư mục")
 
-    # Lấy danh sách tất cả các file trong thư mục
-    file_list = os.listdir(folder_path)
-
-    # Lọc ra các file hình ảnh
-    image_files = [file for file in file_list if file.lower().endswith(('.png', '.jpg', '.jpeg', '.gif'))]
+    # Duyệt thư mục một lần bằng os.scandir và lọc ra các file hình ảnh (đường dẫn đầy đủ)
+    with os.scandir(folder_path) as entries:
+        image_files = [entry for entry in entries
+                       if entry.is_file() and IMAGE_NAME_RE.search(entry.name)]
 
     if not image_files:
         st.warning("Không tìm thấy hình ảnh nào trong thư mục.")
     else:
         st.write(f"Tìm thấy {len(image_files)} hình ảnh:")
-        for image_file in image_files:
-            image_path = os.path.join(folder_path, image_file)
-            st.image(image_path, caption=image_file, use_container_width=True)
+        # Một lần gọi st.image cho cả danh sách thay vì một phần tử cho mỗi ảnh
+        st.image([image_file.path for image_file in image_files],
+                 caption=[image_file.name for image_file in image_files],
+                 use_container_width=True)
 
-async def main():
+def main():
     st.set_page_config(
         page_title="Web Content Crawler",
         page_icon="🕷️",
@@ -41,10 +203,6 @@ async def main():
     st.title("🕷️ Web Content Crawler")
     st.markdown("Extract and analyze web content selectively")
     
-    # Initialize crawler
-    if 'crawler' not in st.session_state:
-        st.session_state.crawler = WebCrawler()
-    
     # URL Input
     url = st.text_input("Enter URL to crawl:", placeholder="https://example.com")
     
@@ -65,36 +223,37 @@ async def main():
         if url:
             if 'extracted_content' in st.session_state:
                 del st.session_state.extracted_content
+            # The previous page's highlights are no longer shown
+            release_spell_crawler()
                 
-            crawler = st.session_state.crawler
-            print(crawler)
+            crawler = get_crawler()
             # Check URL availability
             with st.spinner("Checking URL availability..."):
-                url_status = await crawler.check_url_availability(url)
+                url_status = run_async(crawler.check_url_availability(url))
             
             if url_status["available"]:
                 st.success(f"✅ URL is accessible (Status: {url_status['status_code']})")
                 st.info(f"Content Type: {url_status['content_type']}")
                 
-                # Crawl the website
+                # Crawl the website (served from the cache for a recently crawled URL)
                 with st.spinner("Crawling website..."):
-                    success = False
-                    
-                    if crawl_method == "Requests + BeautifulSoup":
-                        success = await crawler.crawl_with_requests(url)
-                    elif crawl_method == "Playwright (JS support)":
-                        success = await crawler.crawl_with_playwright(url, wait_time)
-                    else:  # Auto
-                        success = await crawler.crawl_with_requests(url)
-                        if not success:
-                            st.info("Requests failed, trying Playwright...")
-                            success = await crawler.crawl_with_playwright(url, wait_time)
+                    try:
+                        validator = page_validator(url_status)
+                        _, fallback_reason = cached_crawl(url, crawl_method, wait_time, validator)
+                        success = True
+                    except Exception as e:
+                        error = str(e)
+                        success = False
                 
                 if success:
+                    if fallback_reason:
+                        st.info(f"{fallback_reason}: crawled with Playwright instead")
                     st.success("🎉 Website crawled successfully!")
                     st.session_state.crawl_success = True
+                    # Extractions below are cached on the crawl's key, not on the live widgets
+                    st.session_state.crawl_key = (url, crawl_method, wait_time, validator)
                 else:
-                    st.error("❌ Failed to crawl the website")
+                    st.error(f"❌ Failed to crawl the website: {error}")
                     st.session_state.crawl_success = False
             else:
                 st.error(f"❌ URL is not accessible: {url_status.get('error')}")
@@ -107,9 +266,10 @@ async def main():
         st.markdown("---")
         st.subheader("📋 Select Content to Display")
         
-        mycrawler = st.session_state.crawler
+        crawl_key = st.session_state.crawl_key
+        crawled_url = crawl_key[0]
 
-        # Initialize cache for extracted content
+        # Spell check results (the other extractions are cached by cached_extract)
         if 'extracted_content' not in st.session_state:
             st.session_state.extracted_content = {}
 
@@ -119,60 +279,67 @@ async def main():
             ["Page Content", "Spell Check", "Images", "Links", "Tables", "URL Info"],
             default=["Page Content"]
         )
+
+        # All selected extractions at once, before rendering (deduplicated, stable order)
+        with st.spinner("Extracting content..."):
+            extracted = cached_extract(*crawl_key, tuple(option for option in EXTRACTORS if option in content_options))
         
         for option in content_options:
             # st.markdown(f"### {option}")
             
-            # Only process if not already extracted (or force re-extract if needed)
             if option == "Page Content":
-                if "Page Content" not in st.session_state.extracted_content:
-                    with st.spinner("Extracting page content..."):
-                        content = await mycrawler.extract_page_content()
-                    st.session_state.extracted_content["Page Content"] = content
-                else:
-                    content = st.session_state.extracted_content["Page Content"]
+                content = extracted[option]
 
                 st.markdown("### Page Content")
                 col1, col2 = st.columns([2, 1])
                 with col1:
-                    st.text_area("Main Content", content.get("main_content", ""), height=300)
+                    main_content = content.get("main_content", "")
+                    # Only a window of long articles goes over the websocket on each rerun
+                    st.text_area("Main Content", main_content[:MAIN_CONTENT_MAX_CHARS], height=300)
+                    if len(main_content) > MAIN_CONTENT_MAX_CHARS:
+                        st.caption(f"Showing the first {MAIN_CONTENT_MAX_CHARS:,} of {len(main_content):,} characters")
+                        st.download_button(
+                            label="Download full content",
+                            data=main_content,
+                            file_name="main_content.txt",
+                            mime="text/plain"
+                        )
                 with col2:
                     st.metric("Word Count", content.get("word_count", 0))
                     st.write("**Title:**", content.get("title", ""))
                     st.write("**Meta Description:**", content.get("meta_description", ""))
                     if content.get("headings"):
                         st.write("**Headings:**")
-                        for heading in content["headings"][:10]:
-                            st.write(f"{heading['level']}: {heading['text']}")
+                        # One markdown element instead of one st.write per heading
+                        st.markdown("\n".join(f"- **{heading['level']}**: {heading['text']}"
+                                              for heading in content["headings"][:10]))
             
             elif option == "Images":
-                if "Images" not in st.session_state.extracted_content:
-                    with st.spinner("Extracting images..."):
-                        images = await mycrawler.extract_images()
-                    st.session_state.extracted_content["Images"] = images
-                else:
-                    images = st.session_state.extracted_content["Images"]
+                df_images = extracted[option]
 
                 st.markdown("### Images")
-                st.write(f"Found {len(images)} images")
-                if images:
-                    df_images = pd.DataFrame(images)
+                st.write(f"Found {len(df_images)} images")
+                if not df_images.empty:
                     st.dataframe(df_images, use_container_width=True)
-                    for i, img in enumerate(images[:5]):
+                    preview = df_images.head(5)
+                    # Downloaded server-side in one concurrent batch, not one by one
+                    previews = prefetch_images(tuple(preview['src']))
+                    for src, alt, image in zip(preview['src'], preview['alt'], previews):
                         try:
-                            st.image(img['src'], caption=img['alt'], width=300)
+                            if image is None:
+                                raise ValueError("image could not be downloaded")
+                            st.image(image, caption=alt, width=300)
                         except Exception:
-                            st.write(f"Could not display image: {img['src']}")
+                            st.write(f"Could not display image: {src}")
 
             elif option == "Spell Check":
                 import io
                 # import streamlit as st
                 if "Spell Check" not in st.session_state.extracted_content:
                     with st.spinner("Checking Incorrect Text..."):
-                        # Optional: cleanup only once before spell check
-                        if mycrawler:
-                            await mycrawler.cleanup()
-                        table = await mycrawler.highlight_incorrect_text()
+                        crawler, table = run_async(spell_check(crawled_url, get_browser_pool()))
+                    if crawler is not None:
+                        st.session_state.spell_crawler = crawler
                     st.session_state.extracted_content["Spell Check"] = table
                 else:
                     table = st.session_state.extracted_content["Spell Check"]
@@ -191,50 +358,36 @@ async def main():
                     mime="text/csv"
                 )
             elif option == "Links":
-                if "Links" not in st.session_state.extracted_content:
-                    with st.spinner("Extracting links..."):
-                        links = await mycrawler.extract_links()
-                    st.session_state.extracted_content["Links"] = links
-                else:
-                    links = st.session_state.extracted_content["Links"]
+                df_links = extracted[option]
 
                 st.markdown("### Links")
-                st.write(f"Found {len(links)} links")
-                if links:
-                    df_links = pd.DataFrame(links)
+                st.write(f"Found {len(df_links)} links")
+                if not df_links.empty:
                     st.dataframe(df_links, use_container_width=True)
             
             elif option == "Tables":
-                if "Tables" not in st.session_state.extracted_content:
-                    with st.spinner("Extracting tables..."):
-                        tables = await mycrawler.extract_tables()
-                    st.session_state.extracted_content["Tables"] = tables
-                else:
-                    tables = st.session_state.extracted_content["Tables"]
+                tables = extracted[option]
 
                 st.markdown("### Tables")
                 st.write(f"Found {len(tables)} tables")
                 for i, table in enumerate(tables):
                     st.write(f"**Table {i+1}:**")
-                    st.dataframe(table, use_container_width=True)
+                    if len(table) > TABLE_PREVIEW_ROWS and not st.checkbox(
+                            f"Show all {len(table):,} rows", value=False, key=f"table_all_rows_{i}"):
+                        st.dataframe(table.head(TABLE_PREVIEW_ROWS), use_container_width=True)
+                    else:
+                        st.dataframe(table, use_container_width=True)
 
             elif option == "URL Info":
                 # This is cheap, no need to cache
                 st.markdown("### URL Info")
+                parsed = urlparse(crawled_url)
                 st.json({
-                    "crawled_url": mycrawler.url,
-                    "domain": urlparse(mycrawler.url).netloc,
-                    "scheme": urlparse(mycrawler.url).scheme,
-                    "path": urlparse(mycrawler.url).path
+                    "crawled_url": crawled_url,
+                    "domain": parsed.netloc,
+                    "scheme": parsed.scheme,
+                    "path": parsed.path
                 })
 
-def test(url: str):
-    from bs4 import BeautifulSoup
-    import time
-    
-    crawler = WebCrawler()
-    success = crawler.crawl_with_playwright(url, 3)
-    # print(success)
-
 if __name__ == "__main__":
-    asyncio.run(main())
+    main()